@@ -1,22 +1,50 @@
 #!/usr/bin/env python3
 
+import io
 import os
+import gzip
 import sys
+import json
+import time
+import tarfile
 import subprocess
 import argparse
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from transport import transport_for, local_state_dir
+from sync_manifest import MANIFEST_NAME, DELETIONS_NAME, CountingWriter, build_manifest, diff_manifests
+from image_push import SERVICE_IMAGES, PLATFORMS, parse_layer_lists, write_delta_archive
+from timing import RunTimer
+from readiness import READY, WAITING, FAILED, ServiceFailed, wait_for_ready
+
+# Application services replaced one by one during a rolling deploy, in dependency order
+ROLLING_SERVICES = ["backend", "frontend"]
+
+# Endpoints polled on the VPS to decide a service is serving traffic
+READINESS_ENDPOINTS = {
+    "backend": "http://localhost:3001/api/health",
+    "frontend": "http://localhost:3000/",
+}
+
 class WMSDeployer:
-    def __init__(self, host, user="root", project_dir="/opt/wms"):
+    def __init__(self, host, user="root", project_dir="/opt/wms", ready_timeout=300):
         self.host = host
         self.user = user
         self.project_dir = project_dir
+        self.ready_timeout = ready_timeout
         self.local_project_dir = Path.cwd()
+        self.transport = transport_for(host, user)
+        self.timer = RunTimer("deploy", host)
+        self.transport.timer = self.timer
         
     def run_local_command(self, command, check=True):
         """Run command locally"""
         print(f"[LOCAL] {command}")
+        started = time.monotonic()
         result = subprocess.run(command, shell=True, capture_output=True, text=True)
+        self.timer.record_command(command, time.monotonic() - started, result.returncode,
+                                  bytes_in=len(result.stdout) + len(result.stderr), where="local")
         if check and result.returncode != 0:
             print(f"Error: {result.stderr}")
             sys.exit(1)
@@ -24,23 +52,75 @@ class WMSDeployer:
     
     def run_remote_command(self, command, check=True):
         """Run command on remote server via SSH"""
-        ssh_command = f"ssh {self.user}@{self.host} '{command}'"
         print(f"[REMOTE] {command}")
-        result = subprocess.run(ssh_command, shell=True, capture_output=True, text=True)
+        result = self.transport.run(command)
         if check and result.returncode != 0:
             print(f"Error: {result.stderr}")
             sys.exit(1)
         return result
     
-    def sync_files(self):
+    def sync_files(self, full=False):
         """Sync project files to remote server"""
+        if full:
+            return self.rsync_files()
+        
         print("\n=== Syncing files to remote server ===")
+        started = time.monotonic()
+        
+        # Hash the tree locally, reusing cached hashes for untouched files
+        manifest, rehashed = build_manifest(str(self.local_project_dir), str(local_state_dir(self.host) / "deploy-hash-cache.json"))
+        remote_result = self.run_remote_command(f"mkdir -p {self.project_dir} && cat {self.project_dir}/{MANIFEST_NAME} 2>/dev/null || true")
+        try:
+            remote_manifest = json.loads(remote_result.stdout) if remote_result.stdout.strip() else {}
+        except ValueError:
+            remote_manifest = {}
+        changed, deleted = diff_manifests(manifest, remote_manifest)
+        scanned = time.monotonic() - started
+        print(f"Scanned {len(manifest)} files in {scanned * 1000:.0f}ms ({rehashed} rehashed): {len(changed)} changed, {len(deleted)} deleted")
+        
+        if not changed and not deleted:
+            print("Files already up to date!")
+            return
+        
+        # One compressed tar stream carries the changed files, the deletion list and the new manifest
+        extract_command = (
+            f"cd {self.project_dir} && tar -xzf - && "
+            f"tr '\\n' '\\0' < {DELETIONS_NAME} | xargs -0 -r rm -f -- && rm -f {DELETIONS_NAME}"
+        )
+        print(f"[REMOTE] {extract_command}")
+        streamed = time.monotonic()
+        process = self.transport.open(extract_command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        counter = CountingWriter(process.stdin)
+        with tarfile.open(fileobj=counter, mode="w|gz") as archive:
+            for path in changed:
+                archive.add(self.local_project_dir / path, arcname=path, recursive=False)
+            for name, data in [(DELETIONS_NAME, "\n".join(deleted)), (MANIFEST_NAME, json.dumps(manifest))]:
+                payload = data.encode()
+                info = tarfile.TarInfo(name)
+                info.size = len(payload)
+                info.mtime = int(time.time())
+                archive.addfile(info, io.BytesIO(payload))
+        process.stdin.close()
+        stderr = process.stderr.read().decode(errors="replace")
+        returncode = process.wait()
+        self.transport.record_stream(extract_command, time.monotonic() - streamed, returncode, bytes_out=counter.bytes)
+        if returncode != 0:
+            print(f"Error: {stderr}")
+            sys.exit(1)
+        
+        elapsed = time.monotonic() - started
+        print(f"Sent {counter.bytes / 1024:.1f} KiB for {len(changed)} files in {elapsed:.1f}s")
+        print("Files synced successfully!")
+    
+    def rsync_files(self):
+        """Sync the whole tree with rsync (ignores the deploy manifest)"""
+        print("\n=== Syncing files to remote server (rsync) ===")
         
         # Create project directory on remote
         self.run_remote_command(f"mkdir -p {self.project_dir}")
         
-        # Sync files using rsync
-        rsync_command = f"rsync -avz --delete --exclude='.git' --exclude='node_modules' --exclude='.next' --exclude='dist' --exclude='build' --exclude='.env*' . {self.user}@{self.host}:{self.project_dir}/"
+        # --delete also drops the deploy manifest, so the next incremental sync re-sends everything
+        rsync_command = f"rsync -avz -e \"{self.transport.rsh_command()}\" --delete --exclude='.git' --exclude='node_modules' --exclude='.next' --exclude='dist' --exclude='build' --exclude='.env*' . {self.user}@{self.host}:{self.project_dir}/"
         self.run_local_command(rsync_command)
         
         print("Files synced successfully!")
@@ -129,22 +209,152 @@ NEXT_PUBLIC_ENABLE_DARK_MODE=true
         
         print("Dependencies installed successfully!")
     
-    def deploy(self):
+    def compose_command(self, args):
+        """Build a docker-compose command for the production stack"""
+        return f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml {args}"
+    
+    def build_images_locally(self):
+        """Build application images on this machine, reusing its layer cache"""
+        print("\n=== Building images locally ===")
+        arch = self.run_remote_command("uname -m").stdout.strip()
+        platform = PLATFORMS.get(arch, f"linux/{arch}")
+        
+        for service, image in SERVICE_IMAGES.items():
+            self.run_local_command(f"DOCKER_BUILDKIT=1 docker build --platform {platform} -t {image} {self.local_project_dir / service}")
+    
+    def push_images(self):
+        """Ship locally built images, sending only layers the VPS does not have"""
+        print("\n=== Pushing images ===")
+        started = time.monotonic()
+        
+        layers = self.run_remote_command("docker image ls -q | sort -u | xargs -r docker image inspect -f '{{json .RootFS.Layers}}'")
+        present = parse_layer_lists(layers.stdout)
+        
+        archive_path = local_state_dir(self.host) / "images.tar"
+        self.run_local_command(f"docker save -o {archive_path} {' '.join(SERVICE_IMAGES.values())}")
+        
+        print("[REMOTE] gzip -dc | docker load")
+        streamed = time.monotonic()
+        process = self.transport.open("gzip -dc | docker load", stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        counter = CountingWriter(process.stdin)
+        try:
+            with gzip.GzipFile(fileobj=counter, mode="wb", compresslevel=3) as stream:
+                sent, skipped = write_delta_archive(archive_path, stream, present)
+            process.stdin.close()
+            output = process.stdout.read().decode(errors="replace")
+            stderr = process.stderr.read().decode(errors="replace")
+        finally:
+            archive_path.unlink()
+        returncode = process.wait()
+        self.transport.record_stream("gzip -dc | docker load", time.monotonic() - streamed, returncode, bytes_out=counter.bytes)
+        if returncode != 0:
+            print(f"Error: {stderr}")
+            sys.exit(1)
+        
+        print(output.strip())
+        elapsed = time.monotonic() - started
+        print(f"Sent {sent} layers ({skipped} already on the server) as {counter.bytes / 1024 / 1024:.1f} MiB in {elapsed:.1f}s")
+    
+    def deploy(self, strategy="rolling", build="remote"):
         """Deploy the application"""
-        print("\n=== Deploying application ===")
+        if build == "local":
+            with self.timer.stage("build"):
+                self.build_images_locally()
+            with self.timer.stage("push"):
+                self.push_images()
+        
+        if strategy == "recreate":
+            # Locally built images are already tagged on the server; compose must not rebuild them
+            return self.deploy_recreate("--no-build" if build == "local" else "--build")
+        
+        print("\n=== Deploying application (rolling) ===")
+        
+        # Build new images while the current containers keep serving; the layer cache is kept
+        if build == "remote":
+            with self.timer.stage("build"):
+                self.run_remote_command(self.compose_command("build"))
+        
+        # Data services are only recreated if their configuration changed
+        with self.timer.stage("data-services"):
+            self.run_remote_command(self.compose_command("up -d --no-deps postgres redis"))
+            self.wait_for_services(["postgres", "redis"])
+        
+        # Swap application containers one at a time, each gated on its healthcheck; images are built by now
+        for service in ROLLING_SERVICES:
+            print(f"Rolling {service}...")
+            with self.timer.stage(service):
+                self.run_remote_command(self.compose_command(f"up -d --no-deps --no-build {service}"))
+                with self.timer.stage("health"):
+                    self.wait_for_services([service])
+        
+        # Only dangling images from the replaced containers; build cache stays warm
+        self.run_remote_command("docker image prune -f", check=False)
+        
+        print("Application deployed successfully!")
+    
+    def container_check(self, service, require_healthy=True):
+        """Readiness check on a service container's state and healthcheck"""
+        inspect = f"docker inspect -f '{{{{if .State.Health}}}}{{{{.State.Health.Status}}}}{{{{else}}}}{{{{.State.Status}}}}{{{{end}}}}' $({self.compose_command(f'ps -q {service}')})"
+        # The first healthcheck only runs after its interval; an endpoint check can prove readiness sooner
+        ready_states = ("healthy", "running") if require_healthy else ("healthy", "running", "starting")
+        
+        def check():
+            status = self.transport.run(inspect).stdout.strip()
+            if status in ready_states:
+                return READY, status
+            if status in ("unhealthy", "exited", "dead"):
+                return FAILED, f"container is {status}"
+            return WAITING, status or "no container"
+        return check
+    
+    def endpoint_check(self, url):
+        """Readiness check on an HTTP endpoint, requested from the VPS itself"""
+        command = f"curl -s -o /dev/null -m 5 -w '%{{http_code}}' {url}"
+        
+        def check():
+            code = self.transport.run(command).stdout.strip()
+            if code.isdigit() and 200 <= int(code) < 400:
+                return READY, code
+            return WAITING, f"HTTP {code}" if code.isdigit() and code != "000" else "not answering"
+        return check
+    
+    def wait_for_services(self, services):
+        """Block until every service is ready, or exit with the failing service's logs"""
+        checks = {}
+        for service in services:
+            url = READINESS_ENDPOINTS.get(service)
+            checks[service] = self.container_check(service, require_healthy=url is None)
+            if url:
+                checks[f"{service} {url}"] = self.endpoint_check(url)
+        
+        print(f"Waiting for {', '.join(services)} (up to {self.ready_timeout}s)...")
+        try:
+            ready = wait_for_ready(checks, self.ready_timeout)
+        except ServiceFailed as e:
+            service = e.name.split()[0]
+            print(f"✗ {e}")
+            logs = self.run_remote_command(self.compose_command(f"logs --tail=50 {service}"), check=False)
+            print(logs.stdout)
+            sys.exit(1)
+        for name, seconds in ready.items():
+            print(f"✓ {name} ready after {seconds:.1f}s")
+    
+    def deploy_recreate(self, build_flag="--build"):
+        """Deploy by stopping everything and rebuilding from scratch"""
+        print("\n=== Deploying application (recreate) ===")
         
         # Stop existing containers
-        self.run_remote_command(f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml down", check=False)
+        self.run_remote_command(self.compose_command("down"), check=False)
         
         # Remove old images
         self.run_remote_command("docker system prune -f", check=False)
         
         # Build and start containers
-        self.run_remote_command(f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml up -d --build")
+        self.run_remote_command(self.compose_command(f"up -d {build_flag}"))
         
         # Wait for services to be healthy
-        print("Waiting for services to be healthy...")
-        self.run_remote_command(f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml ps")
+        with self.timer.stage("health"):
+            self.wait_for_services(["postgres", "redis", *ROLLING_SERVICES])
         
         print("Application deployed successfully!")
     
@@ -248,19 +458,26 @@ server {{
         print("Note: You need to setup SSL certificates for HTTPS")
         return True
     
-    def run_full_deployment(self, skip_nginx=False):
+    def run_full_deployment(self, skip_nginx=False, full_sync=False, strategy="rolling", build="remote"):
         """Run complete deployment process"""
         print(f"Starting deployment to {self.host}...")
+        status = "failed"
         
         try:
-            self.sync_files()
-            self.setup_environment()
-            self.install_dependencies()
-            self.deploy()
+            with self.timer.stage("sync"):
+                self.sync_files(full=full_sync)
+            with self.timer.stage("environment"):
+                self.setup_environment()
+            with self.timer.stage("dependencies"):
+                self.install_dependencies()
+            with self.timer.stage("deploy"):
+                self.deploy(strategy, build)
             
             nginx_configured = False
             if not skip_nginx:
-                nginx_configured = self.setup_nginx()
+                with self.timer.stage("nginx"):
+                    nginx_configured = self.setup_nginx()
+            status = "ok"
             
             print("\n=== Deployment completed successfully! ===")
             
@@ -275,6 +492,8 @@ server {{
         except Exception as e:
             print(f"\nDeployment failed: {e}")
             sys.exit(1)
+        finally:
+            self.timer.finish(status)
 
 def main():
     parser = argparse.ArgumentParser(description='Deploy WMS to VPS')
@@ -282,11 +501,15 @@ def main():
     parser.add_argument('--user', default='root', help='SSH user')
     parser.add_argument('--project-dir', default='/opt/wms', help='Project directory on VPS')
     parser.add_argument('--skip-nginx', action='store_true', help='Skip Nginx setup')
+    parser.add_argument('--strategy', default='rolling', choices=['rolling', 'recreate'], help='How to replace running containers')
+    parser.add_argument('--build', default='remote', choices=['remote', 'local'], help='Build images on the VPS or locally and push only missing layers')
+    parser.add_argument('--ready-timeout', type=int, default=300, help='Seconds to wait for services to become ready')
+    parser.add_argument('--full-sync', action='store_true', help='Sync the whole tree with rsync instead of the deploy manifest')
     
     args = parser.parse_args()
     
-    deployer = WMSDeployer(args.host, args.user, args.project_dir)
-    deployer.run_full_deployment(skip_nginx=args.skip_nginx)
+    deployer = WMSDeployer(args.host, args.user, args.project_dir, args.ready_timeout)
+    deployer.run_full_deployment(skip_nginx=args.skip_nginx, full_sync=args.full_sync, strategy=args.strategy, build=args.build)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,108 +3,702 @@
 import os
 import sys
 import subprocess
+import re
+import time
+import json
+import hashlib
+import shlex
 import datetime
 from pathlib import Path
 
+from transport import transport_for, local_state_dir
+from backup_catalog import BackupCatalog, select_expired
+
+# pg_dump output is piped through these; pigz compresses on every core when installed
+CODECS = {
+    "gzip": {
+        "extension": ".gz",
+        "compress": "$(command -v pigz || echo gzip) -{level}",
+        "decompress": "gzip -dc",
+        "level": 6,
+    },
+    "zstd": {
+        "extension": ".zst",
+        "compress": "zstd -q -T0 -{level}",
+        "decompress": "zstd -dcq",
+        "level": 3,
+    },
+}
+
+# archive_timeout forces a WAL switch at least once a minute on a quiet database
+WAL_SETTINGS = {
+    "wal_level": "replica",
+    "archive_mode": "on",
+    "archive_command": "test ! -f /backup/wal/%f && cp %p /backup/wal/%f",
+    "archive_timeout": "60",
+}
+
+# The postgres volume's mount point; recovery swaps its contents through these two subdirectories
+PGDATA = "/var/lib/postgresql/data"
+PGDATA_STAGING = ".pitr-base"
+PGDATA_PREVIOUS = ".pitr-previous"
+
+# Archived segment names: timeline, then log and segment number (16 MiB segments, 256 per log)
+WAL_SEGMENT = re.compile(r"^[0-9A-F]{24}$")
+
+CHUNKSTORE_SOURCE = (Path(__file__).resolve().parent / "remote_chunkstore.py").read_text()
+
+# dd status=progress and its final summary both start with the byte count
+DD_PROGRESS = re.compile(rb"^(\d+) bytes")
+
+def format_bytes(size):
+    """Format a byte count with a binary unit suffix"""
+    for unit in ["B", "Ki", "Mi", "Gi"]:
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}Ti"
+
+def dd_bytes(stderr):
+    """Return the byte count from dd's closing summary, or None"""
+    for line in reversed(stderr.splitlines()):
+        match = DD_PROGRESS.match(line.encode())
+        if match:
+            return int(match.group(1))
+    return None
+
+def wal_segment_number(name):
+    """Position of a WAL segment in the WAL stream, ignoring its timeline"""
+    return int(name[8:16], 16) * 0x100 + int(name[16:24], 16)
+
+def wal_segment_name(timeline, number):
+    return f"{timeline}{number // 0x100:08X}{number % 0x100:08X}"
+
+def codec_for(filename):
+    """Return the codec name for a backup file, or None if uncompressed"""
+    for name, settings in CODECS.items():
+        if filename.endswith(settings["extension"]):
+            return name
+    return None
+
 class DatabaseBackup:
-    def __init__(self, host="forest-vps", user="root", project_dir="/opt/wms"):
+    def __init__(self, host="forest-vps", user="root", project_dir="/opt/wms", keep_hourly=24, keep_daily=7, keep_weekly=4):
         self.host = host
         self.user = user
         self.project_dir = project_dir
         self.backup_dir = f"{project_dir}/backup"
+        self.repo_dir = f"{self.backup_dir}/repo"
+        self.transport = transport_for(host, user)
+        self.catalog = BackupCatalog(str(local_state_dir(host) / "backup-catalog.json"))
+        self.retention = {"keep_hourly": keep_hourly, "keep_daily": keep_daily, "keep_weekly": keep_weekly}
         
     def run_remote_command(self, command, check=True):
         """Run command on remote server via SSH"""
-        ssh_command = f"ssh {self.user}@{self.host} '{command}'"
         print(f"[REMOTE] {command}")
-        result = subprocess.run(ssh_command, shell=True, capture_output=True, text=True)
+        result = self.transport.run(command)
         if check and result.returncode != 0:
             print(f"Error: {result.stderr}")
             sys.exit(1)
         return result
     
-    def create_backup(self):
+    def pipefail(self, pipeline):
+        """Wrap a shell pipeline so a failure in any stage fails the command"""
+        return f"bash -o pipefail -c {shlex.quote(pipeline)}"
+    
+    def compose_command(self, args):
+        """Build a docker-compose command for the production stack"""
+        # No leading cd, so the command can sit anywhere in a pipeline
+        return f"docker-compose -f {self.project_dir}/docker-compose.production.yml {args}"
+    
+    def chunkstore_command(self, *args):
+        """Build a command running remote_chunkstore.py on the VPS"""
+        return " ".join(["python3", "-c", shlex.quote(CHUNKSTORE_SOURCE), *(shlex.quote(str(arg)) for arg in args)])
+    
+    def run_chunkstore(self, *args):
+        """Run a chunkstore command and return its parsed JSON output"""
+        print(f"[REMOTE] chunkstore {' '.join(str(arg) for arg in args)}")
+        result = self.transport.run(self.chunkstore_command(*args))
+        if result.returncode != 0:
+            print(f"Error: {result.stderr}")
+            sys.exit(1)
+        return json.loads(result.stdout)
+    
+    def database_version(self):
+        """Return the PostgreSQL server version"""
+        result = self.run_remote_command(self.compose_command("exec -T postgres psql -U postgres -tAc 'SHOW server_version'"), check=False)
+        return result.stdout.strip() or None
+    
+    def record_backup(self, name, kind, size, raw_size, codec, duration, sha256, location, **extra):
+        """Add a finished backup to the catalog"""
+        entry = {
+            "name": name,
+            "kind": kind,
+            "created": time.time(),
+            "location": location,
+            "size": size,
+            "raw_size": raw_size,
+            "compression_ratio": round(raw_size / size, 2) if raw_size and size else None,
+            "codec": codec,
+            "duration": round(duration, 2),
+            "throughput": round(raw_size / duration) if raw_size and duration else None,
+            "sha256": sha256,
+            "db_version": self.database_version(),
+        }
+        entry.update(extra)
+        self.catalog.add(entry)
+        return entry
+    
+    def create_backup(self, codec="gzip", level=None, local_dir=None, jobs=1, repo=False):
         """Create database backup"""
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"wms_backup_{timestamp}.sql"
+        if repo:
+            return self.create_snapshot(timestamp, level or CODECS["gzip"]["level"])
+        
+        settings = CODECS[codec]
+        level = level or settings["level"]
+        
+        if jobs > 1:
+            if local_dir:
+                print("Error: --local-dir cannot be combined with --jobs (directory dumps are not streamable)")
+                sys.exit(1)
+            if codec != "gzip":
+                print(f"Note: PostgreSQL 15 directory dumps only support gzip, ignoring --codec {codec}")
+                level = level if level <= 9 else CODECS["gzip"]["level"]
+            return self.create_directory_backup(timestamp, level, jobs)
+        backup_filename = f"wms_backup_{timestamp}.sql{settings['extension']}"
         
         print(f"Creating backup: {backup_filename}")
         
+        # Stream pg_dump straight into the compressor so the dump is written once;
+        # dd's closing summary on stderr gives the uncompressed size
+        dump_command = self.compose_command("exec -T postgres pg_dump -U postgres wms_db")
+        pipeline = f"{dump_command} | dd bs=1M | {settings['compress'].format(level=level)}"
+        
+        if local_dir:
+            destination = Path(local_dir) / backup_filename
+            started = time.monotonic()
+            stderr = self.stream_to_local(pipeline, destination)
+            duration = time.monotonic() - started
+            digest = hashlib.sha256()
+            with open(destination, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            self.record_backup(backup_filename, "local", destination.stat().st_size, dd_bytes(stderr),
+                               codec, duration, digest.hexdigest(), str(destination.resolve()))
+            print(f"Backup downloaded successfully: {destination}")
+            return str(destination)
+        
         # Create backup directory
         self.run_remote_command(f"mkdir -p {self.backup_dir}")
         
-        # Create database backup
-        backup_command = f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml exec -T postgres pg_dump -U postgres wms_db > {self.backup_dir}/{backup_filename}"
-        self.run_remote_command(backup_command)
+        # Write to a partial file so an interrupted dump never looks like a backup
+        backup_path = f"{self.backup_dir}/{backup_filename}"
+        print(f"[REMOTE] {pipeline} > {backup_path}")
+        started = time.monotonic()
+        result = self.transport.run(self.pipefail(
+            f"{pipeline} > {backup_path}.partial && mv {backup_path}.partial {backup_path}"
+            f" && sha256sum {backup_path} && stat -c %s {backup_path}"
+        ))
+        duration = time.monotonic() - started
+        if result.returncode != 0:
+            self.transport.run(f"rm -f {backup_path}.partial")
+            print(f"Error: {result.stderr}")
+            sys.exit(1)
+        
+        digest, _, size = result.stdout.split()
+        entry = self.record_backup(backup_filename, "sql", int(size), dd_bytes(result.stderr),
+                                   codec, duration, digest, backup_path)
+        print(f"Backup created successfully: {backup_filename}")
+        self.print_entry_stats(entry)
+        
+        self.apply_retention("sql", "dir")
+        
+        return backup_filename
+    
+    def create_snapshot(self, timestamp, level):
+        """Dump into the deduplicating repository, writing only new chunks"""
+        name = f"wms_{timestamp}"
+        print(f"Creating snapshot: {name}")
+        
+        dump_command = self.compose_command("exec -T postgres pg_dump -U postgres wms_db")
+        print(f"[REMOTE] {dump_command} | chunkstore store {self.repo_dir} {name}")
+        started = time.monotonic()
+        result = self.transport.run(self.pipefail(f"{dump_command} | {self.chunkstore_command('store', self.repo_dir, name, level)}"))
+        duration = time.monotonic() - started
+        if result.returncode != 0:
+            print(f"Error: {result.stderr}")
+            sys.exit(1)
+        
+        stats = json.loads(result.stdout)
+        entry = self.record_backup(name, "snapshot", stats["new_bytes"], stats["size"], "zlib",
+                                   duration, stats["sha256"], f"{self.repo_dir}/snapshots/{name}.json")
+        print(f"Snapshot created successfully: {name}")
+        print(f"{format_bytes(stats['size'])} in {stats['chunks']} chunks, "
+              f"{stats['new_chunks']} new ({format_bytes(stats['new_bytes'])} written)")
+        self.print_entry_stats(entry)
+        
+        self.apply_retention("snapshot")
+        return name
+    
+    def create_directory_backup(self, timestamp, level, jobs):
+        """Dump in directory format with parallel worker jobs"""
+        backup_filename = f"wms_backup_{timestamp}.dir"
+        backup_path = f"{self.backup_dir}/{backup_filename}"
+        print(f"Creating backup: {backup_filename} ({jobs} jobs)")
+        
+        self.run_remote_command(f"mkdir -p {self.backup_dir}")
+        
+        # ./backup is mounted at /backup in the postgres container
+        dump_command = self.compose_command(f"exec -T postgres pg_dump -U postgres -Fd -j {jobs} -Z {level} -f /backup/{backup_filename}.partial wms_db")
+        print(f"[REMOTE] {dump_command}")
+        started = time.monotonic()
+        result = self.transport.run(
+            f"{dump_command} && mv {backup_path}.partial {backup_path} && du -sb {backup_path}"
+            f" && cd {backup_path} && sha256sum $(ls | sort) | sha256sum"
+        )
+        duration = time.monotonic() - started
+        if result.returncode != 0:
+            self.transport.run(f"rm -rf {backup_path}.partial")
+            print(f"Error: {result.stderr}")
+            sys.exit(1)
+        
+        size_line, digest_line = result.stdout.strip().splitlines()[-2:]
+        entry = self.record_backup(backup_filename, "dir", int(size_line.split()[0]), None, "gzip",
+                                   duration, digest_line.split()[0], backup_path)
+        print(f"Backup created successfully: {backup_filename}")
+        self.print_entry_stats(entry)
+        self.apply_retention("sql", "dir")
+        return backup_filename
+    
+    def setup_wal_archiving(self):
+        """Turn on continuous WAL archiving into the backup directory"""
+        print("Enabling WAL archiving")
+        
+        # ./backup is mounted at /backup; postgres must own the archive it writes to
+        self.run_remote_command(self.compose_command(
+            "exec -T postgres sh -c 'mkdir -p /backup/wal /backup/base && chown postgres:postgres /backup/wal /backup/base'"
+        ))
+        for setting, value in WAL_SETTINGS.items():
+            self.run_remote_command(self.compose_command(
+                f"exec -T postgres psql -U postgres -c {shlex.quote(f'ALTER SYSTEM SET {setting} = $${value}$$')}"
+            ))
         
-        # Compress backup
-        self.run_remote_command(f"cd {self.backup_dir} && gzip {backup_filename}")
+        # wal_level and archive_mode only take effect on restart
+        self.run_remote_command(self.compose_command("restart postgres"))
+        self.wait_for_postgres()
+        print("WAL archiving enabled; take a base backup next (basebackup action)")
+    
+    def wait_for_postgres(self, timeout=1800, check=True):
+        """Block until postgres accepts connections and has left recovery; False if it never does"""
+        probe = self.compose_command("exec -T postgres psql -U postgres -tAc 'SELECT pg_is_in_recovery()'")
+        result = self.run_remote_command(f"timeout {timeout} bash -c {shlex.quote(f'until {probe} 2>/dev/null | grep -qx f; do sleep 2; done')}", check=check)
+        return result.returncode == 0
+    
+    def create_base_backup(self):
+        """Take a physical base backup that WAL from the archive can roll forward"""
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        name = f"wms_base_{timestamp}"
+        base_path = f"{self.backup_dir}/base/{name}"
+        print(f"Creating base backup: {name}")
         
-        print(f"Backup created successfully: {backup_filename}.gz")
+        # -X none: the WAL needed to make it consistent is already being archived
+        backup_command = self.compose_command(f"exec -T postgres pg_basebackup -U postgres -D /backup/base/{name}.partial -Ft -z -X none -c fast")
+        print(f"[REMOTE] {backup_command}")
+        started = time.monotonic()
+        result = self.transport.run(
+            f"{backup_command} && mv {base_path}.partial {base_path} && du -sb {base_path}"
+            f" && sha256sum {base_path}/base.tar.gz && tar -xzOf {base_path}/base.tar.gz backup_label"
+        )
+        duration = time.monotonic() - started
+        if result.returncode != 0:
+            self.transport.run(f"rm -rf {base_path}.partial")
+            print(f"Error: {result.stderr}")
+            sys.exit(1)
         
-        # Clean old backups (keep last 7 days)
-        self.run_remote_command(f"find {self.backup_dir} -name '*.gz' -mtime +7 -delete")
+        lines = result.stdout.splitlines()
+        start_wal = re.search(r"START WAL LOCATION: .* \(file (\w+)\)", result.stdout).group(1)
+        entry = self.record_backup(name, "base", int(lines[0].split()[0]), None, "gzip", duration,
+                                   lines[1].split()[0], base_path, start_wal=start_wal)
+        print(f"Base backup created successfully: {name}")
+        self.print_entry_stats(entry)
         
-        return f"{backup_filename}.gz"
+        self.apply_retention("base")
+        self.prune_wal_archive()
+        return name
+    
+    def prune_wal_archive(self):
+        """Drop archived WAL that predates the oldest kept base backup"""
+        bases = self.catalog.sorted(["base"])
+        if bases:
+            self.run_remote_command(self.compose_command(f"exec -T postgres pg_archivecleanup /backup/wal {bases[0]['start_wal']}"))
     
-    def restore_backup(self, backup_file):
+    def parse_target_time(self, target):
+        """Parse a recovery target into an aware datetime, in the database server's zone unless it has an offset"""
+        try:
+            target_time = datetime.datetime.fromisoformat(target)
+        except ValueError:
+            print(f"Error: cannot parse {target!r}, use e.g. '2026-10-18 14:05' or '2026-10-18 14:05+07:00'")
+            sys.exit(1)
+        if target_time.tzinfo is not None:
+            return target_time
+        
+        # Let postgres place the wall-clock time in its own zone, DST included
+        literal = f"timestamptz '{target_time.isoformat(sep=' ')}'"
+        query = f"SELECT extract(epoch FROM {literal}), extract(timezone FROM {literal})"
+        result = self.run_remote_command(self.compose_command(f"exec -T postgres psql -U postgres -tAc {shlex.quote(query)}"), check=False)
+        try:
+            epoch, offset = result.stdout.strip().split("|")
+        except ValueError:
+            print("Error: cannot read the database server's time zone; give --to with an offset, e.g. '2026-10-18 14:05+07:00'")
+            sys.exit(1)
+        zone = datetime.timezone(datetime.timedelta(seconds=int(float(offset))))
+        return datetime.datetime.fromtimestamp(float(epoch), zone)
+    
+    def restore_to_time(self, target):
+        """Point-in-time recovery: newest base backup before target plus archived WAL"""
+        target_time = self.parse_target_time(target)
+        candidates = [e for e in self.catalog.sorted(["base"]) if e["created"] <= target_time.timestamp()]
+        if not candidates:
+            print(f"Error: no base backup finished before {target_time.isoformat(sep=' ')} (see: list)")
+            sys.exit(1)
+        base = candidates[-1]
+        print(f"Recovering to {target_time.isoformat(sep=' ')} from base backup {base['name']}")
+        
+        # Everything that can fail before postgres replays WAL is checked while the old data is still live
+        if self.run_remote_command(f"test -s {base['location']}/base.tar.gz", check=False).returncode != 0:
+            print(f"Error: {base['location']}/base.tar.gz is missing or empty")
+            sys.exit(1)
+        missing = self.check_wal_coverage(base, target_time)
+        if missing:
+            print(f"Error: {missing}")
+            sys.exit(1)
+        
+        self.run_remote_command(self.compose_command("stop backend frontend postgres"))
+        
+        # Extract the base backup next to the data, then swap it in; the old data is only moved aside
+        recovery_settings = "\n".join([
+            "restore_command = 'cp /backup/wal/%f %p'",
+            f"recovery_target_time = '{target_time.strftime('%Y-%m-%d %H:%M:%S%z')}'",
+            "recovery_target_action = 'promote'",
+        ])
+        swap_script = " && ".join([
+            f"cd {PGDATA}",
+            f"{{ test ! -e {PGDATA_PREVIOUS} || {{ echo '{PGDATA}/{PGDATA_PREVIOUS} is left from an earlier recovery, inspect and remove it' >&2; exit 1; }}; }}",
+            f"rm -rf {PGDATA_STAGING}",
+            f"mkdir {PGDATA_STAGING}",
+            f"{{ tar -xzf /backup/base/{base['name']}/base.tar.gz -C {PGDATA_STAGING} || {{ rm -rf {PGDATA_STAGING}; exit 1; }}; }}",
+            f"printf '%s\\n' {shlex.quote(recovery_settings)} >> {PGDATA_STAGING}/postgresql.auto.conf",
+            f"touch {PGDATA_STAGING}/recovery.signal",
+            f"mkdir {PGDATA_PREVIOUS}",
+            f"find . -mindepth 1 -maxdepth 1 ! -name {PGDATA_PREVIOUS} ! -name {PGDATA_STAGING} -exec mv {{}} {PGDATA_PREVIOUS}/ \\;",
+            f"find {PGDATA_STAGING} -mindepth 1 -maxdepth 1 -exec mv {{}} . \\;",
+            f"rmdir {PGDATA_STAGING}",
+            "chown -R postgres:postgres .",
+            "chmod 700 .",
+        ])
+        if self.run_remote_command(self.compose_command(f"run --rm --no-deps -T --entrypoint sh postgres -c {shlex.quote(swap_script)}"), check=False).returncode != 0:
+            self.run_remote_command(self.compose_command("start postgres backend frontend"))
+            print("Error: could not extract the base backup; the data directory was left as it was")
+            sys.exit(1)
+        
+        self.run_remote_command(self.compose_command("up -d postgres"))
+        if not self.wait_for_postgres(check=False):
+            self.rollback_recovery()
+            print("Error: recovery did not finish; the previous data is back in place (see: docker-compose logs postgres)")
+            sys.exit(1)
+        
+        # Recovery settings are only read at startup; clear them so the next restart is a normal one
+        for setting in ["restore_command", "recovery_target_time", "recovery_target_action"]:
+            self.run_remote_command(self.compose_command(f"exec -T postgres psql -U postgres -c 'ALTER SYSTEM RESET {setting}'"))
+        self.run_remote_command(self.compose_command(f"exec -T postgres rm -rf {PGDATA}/{PGDATA_PREVIOUS}"))
+        
+        self.run_remote_command(self.compose_command("start backend frontend"))
+        print("Database recovered successfully!")
+    
+    def check_wal_coverage(self, base, target_time):
+        """Return why the WAL archive cannot roll the base backup forward to target_time, or None"""
+        result = self.run_remote_command(f"find {self.backup_dir}/wal -maxdepth 1 -type f -printf '%f %T@\\n'", check=False)
+        timeline, start = base["start_wal"][:8], wal_segment_number(base["start_wal"])
+        # Segment number -> when it was archived, on the base backup's timeline or a later one
+        archived = {}
+        for line in result.stdout.splitlines():
+            name, mtime = line.split()
+            if WAL_SEGMENT.match(name) and name[:8] >= timeline:
+                segment = wal_segment_number(name)
+                archived[segment] = max(archived.get(segment, 0), float(mtime))
+        
+        # A segment archived after the target holds (or follows) the last record recovery needs
+        segment = start
+        while segment in archived:
+            if archived[segment] >= target_time.timestamp():
+                return None
+            segment += 1
+        if segment == start:
+            return f"WAL segment {base['start_wal']} of base backup {base['name']} is not in the archive"
+        if segment > max(archived):
+            reached = datetime.datetime.fromtimestamp(archived[segment - 1], target_time.tzinfo)
+            return (f"the WAL archive only reaches {reached.isoformat(sep=' ', timespec='seconds')}; "
+                    f"wait for the next segment (archive_timeout is {WAL_SETTINGS['archive_timeout']}s) or pick an earlier target")
+        return f"WAL segment {wal_segment_name(timeline, segment)} is missing from the archive"
+    
+    def rollback_recovery(self):
+        """Put the data directory moved aside by restore_to_time back and restart the stack"""
+        self.run_remote_command(self.compose_command("stop postgres"), check=False)
+        rollback_script = " && ".join([
+            f"cd {PGDATA}",
+            f"test -d {PGDATA_PREVIOUS}",
+            f"find . -mindepth 1 -maxdepth 1 ! -name {PGDATA_PREVIOUS} -exec rm -rf {{}} +",
+            f"find {PGDATA_PREVIOUS} -mindepth 1 -maxdepth 1 -exec mv {{}} . \\;",
+            f"rmdir {PGDATA_PREVIOUS}",
+        ])
+        self.run_remote_command(self.compose_command(f"run --rm --no-deps -T --entrypoint sh postgres -c {shlex.quote(rollback_script)}"))
+        self.run_remote_command(self.compose_command("up -d postgres"))
+        self.wait_for_postgres(timeout=300)
+        self.run_remote_command(self.compose_command("start backend frontend"))
+    
+    def print_entry_stats(self, entry):
+        """Print size, ratio and throughput for a catalog entry"""
+        stats = [f"{format_bytes(entry['size'])} stored", f"{entry['duration']}s"]
+        if entry["compression_ratio"]:
+            stats.append(f"ratio {entry['compression_ratio']}x")
+        if entry["throughput"]:
+            stats.append(f"{format_bytes(entry['throughput'])}/s")
+        print(", ".join(stats))
+    
+    def apply_retention(self, *kinds):
+        """Delete backups of these kinds that fall outside every retention tier"""
+        expired = select_expired(self.catalog.sorted(kinds), **self.retention)
+        if not expired:
+            return
+        
+        snapshots = [entry["name"] for entry in expired if entry["kind"] == "snapshot"]
+        paths = [entry["location"] for entry in expired if entry["kind"] != "snapshot"]
+        if snapshots:
+            self.run_chunkstore("forget", self.repo_dir, *snapshots)
+        if paths:
+            self.run_remote_command(f"rm -rf {' '.join(paths)}")
+        
+        self.catalog.remove(entry["location"] for entry in expired)
+        print(f"Pruned {len(expired)} backups outside the retention policy")
+    
+    def rescan_catalog(self):
+        """Rebuild the catalog's VPS entries from the backup directory"""
+        result = self.run_remote_command(
+            f"find {self.backup_dir} -maxdepth 1 -name 'wms_backup_*' ! -name '*.partial' -printf '%f %s %T@\\n'",
+            check=False
+        )
+        entries = []
+        for line in result.stdout.splitlines():
+            name, size, created = line.split()
+            kind = "dir" if name.endswith(".dir") else "sql"
+            entries.append({
+                "name": name, "kind": kind, "created": float(created),
+                "location": f"{self.backup_dir}/{name}",
+                "size": None if kind == "dir" else int(size),
+                "codec": "gzip" if kind == "dir" else codec_for(name),
+            })
+        for snapshot in self.run_chunkstore("list", self.repo_dir):
+            entries.append({
+                "name": snapshot["name"], "kind": "snapshot", "created": snapshot["created"],
+                "location": f"{self.repo_dir}/snapshots/{snapshot['name']}.json",
+                "size": snapshot["new_bytes"], "raw_size": snapshot["size"], "codec": "zlib",
+                "sha256": snapshot["sha256"],
+            })
+        
+        # Keep what we already recorded for backups that are still there
+        previous = {entry["location"]: entry for entry in self.catalog.sorted(["sql", "dir", "snapshot"])}
+        self.catalog.remove(previous)
+        for entry in entries:
+            known = {"raw_size": None, "compression_ratio": None, "duration": None,
+                     "throughput": None, "sha256": None, "db_version": None}
+            known.update(entry)
+            self.catalog.entries[entry["location"]] = previous.get(entry["location"], known)
+        self.catalog.save()
+    
+    def stream_to_local(self, pipeline, destination):
+        """Stream a remote pipeline's output into a local file over SSH"""
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        partial = destination.with_name(destination.name + ".partial")
+        print(f"[REMOTE] {pipeline} > [LOCAL] {destination}")
+        with open(partial, "wb") as output:
+            process = self.transport.open(self.pipefail(pipeline), stdout=output, stderr=subprocess.PIPE)
+            _, stderr = process.communicate()
+        stderr = stderr.decode(errors="replace")
+        if process.returncode != 0:
+            partial.unlink()
+            print(f"Error: {stderr}")
+            sys.exit(1)
+        partial.rename(destination)
+        return stderr
+    
+    def restore_backup(self, backup_file, jobs=1, repo=False):
         """Restore database from backup"""
         print(f"Restoring from backup: {backup_file}")
         
-        # Check if backup file exists
-        check_file = self.run_remote_command(f"test -f {self.backup_dir}/{backup_file}")
+        if repo:
+            return self.restore_snapshot(backup_file)
+        if backup_file.endswith(".dir"):
+            return self.restore_directory_backup(backup_file, jobs)
+        if jobs > 1:
+            print("Note: plain SQL backups replay on a single connection, ignoring --jobs")
         
-        # Decompress if needed
-        if backup_file.endswith('.gz'):
-            self.run_remote_command(f"cd {self.backup_dir} && gunzip -c {backup_file} > temp_restore.sql")
-            sql_file = "temp_restore.sql"
-        else:
-            sql_file = backup_file
+        # Check if backup file exists and get its size for progress reporting
+        backup_path = f"{self.backup_dir}/{backup_file}"
+        size_result = self.run_remote_command(f"stat -c %s {backup_path}")
+        total_bytes = int(size_result.stdout.strip())
         
         # Stop application
-        self.run_remote_command(f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml stop backend frontend")
-        
-        # Restore database
-        restore_command = f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml exec -T postgres psql -U postgres -d wms_db < {self.backup_dir}/{sql_file}"
-        self.run_remote_command(restore_command)
+        self.run_remote_command(self.compose_command("stop backend frontend"))
         
-        # Clean temp file
-        if sql_file == "temp_restore.sql":
-            self.run_remote_command(f"rm {self.backup_dir}/{sql_file}")
+        # Read, decompress and replay in one pipeline; dd reports how far into the file we are
+        codec = codec_for(backup_file)
+        decompress = f" | {CODECS[codec]['decompress']}" if codec else ""
+        psql_command = self.compose_command("exec -T postgres psql -U postgres -d wms_db")
+        pipeline = f"dd if={backup_path} bs=1M status=progress{decompress} | {psql_command}"
+        print(f"[REMOTE] {pipeline}")
+        returncode, errors = self.stream_restore(pipeline, total_bytes)
         
         # Start application
-        self.run_remote_command(f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml start backend frontend")
+        self.run_remote_command(self.compose_command("start backend frontend"))
+        
+        if returncode != 0:
+            print(f"Error: {errors}")
+            sys.exit(1)
+        print("Database restored successfully!")
+    
+    def stream_restore(self, pipeline, total_bytes):
+        """Run a restore pipeline, printing dd progress as bytes/second"""
+        process = self.transport.open(self.pipefail(pipeline), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        started = time.monotonic()
+        errors = []
+        buffer = b""
+        
+        while True:
+            chunk = process.stderr.read1(4096)
+            if not chunk:
+                break
+            buffer += chunk
+            *lines, buffer = re.split(rb"[\r\n]", buffer)
+            for line in lines:
+                match = DD_PROGRESS.match(line)
+                if match:
+                    done = int(match.group(1))
+                    elapsed = max(time.monotonic() - started, 0.001)
+                    percent = 100.0 * done / total_bytes if total_bytes else 100.0
+                    print(f"\rRestored {format_bytes(done)}/{format_bytes(total_bytes)} ({percent:.0f}%) at {format_bytes(done / elapsed)}/s   ", end="", flush=True)
+                elif line.strip() and b"records in" not in line and b"records out" not in line:
+                    errors.append(line.decode(errors="replace"))
+        
+        process.wait()
+        elapsed = max(time.monotonic() - started, 0.001)
+        print(f"\nRead {format_bytes(total_bytes)} in {elapsed:.1f}s ({format_bytes(total_bytes / elapsed)}/s)")
+        return process.returncode, "\n".join(errors)
+    
+    def restore_snapshot(self, name):
+        """Reassemble a repository snapshot and replay it into psql"""
+        total_bytes = self.run_chunkstore("info", self.repo_dir, name)["size"]
+        
+        self.run_remote_command(self.compose_command("stop backend frontend"))
+        
+        psql_command = self.compose_command("exec -T postgres psql -U postgres -d wms_db")
+        cat_command = self.chunkstore_command("cat", self.repo_dir, name)
+        print(f"[REMOTE] chunkstore cat {self.repo_dir} {name} | {psql_command}")
+        returncode, errors = self.stream_restore(f"{cat_command} | dd bs=1M status=progress | {psql_command}", total_bytes)
         
+        self.run_remote_command(self.compose_command("start backend frontend"))
+        
+        if returncode != 0:
+            print(f"Error: {errors}")
+            sys.exit(1)
+        print("Database restored successfully!")
+    
+    def restore_directory_backup(self, backup_file, jobs):
+        """Restore a directory-format dump with parallel pg_restore jobs"""
+        self.run_remote_command(f"test -f {self.backup_dir}/{backup_file}/toc.dat")
+        
+        self.run_remote_command(self.compose_command("stop backend frontend"))
+        
+        # --clean drops each object before recreating it, matching a plain-SQL reload
+        restore_command = self.compose_command(f"exec -T postgres pg_restore -U postgres -d wms_db --clean --if-exists -j {jobs} /backup/{backup_file}")
+        result = self.run_remote_command(restore_command, check=False)
+        
+        self.run_remote_command(self.compose_command("start backend frontend"))
+        
+        if result.returncode != 0:
+            print(f"Error: {result.stderr}")
+            sys.exit(1)
         print("Database restored successfully!")
     
-    def list_backups(self):
+    def list_backups(self, repo=False, rescan=False):
         """List available backups"""
-        result = self.run_remote_command(f"ls -la {self.backup_dir}/*.gz 2>/dev/null || echo 'No backups found'")
+        if rescan or not self.catalog.exists():
+            self.rescan_catalog()
+        
+        kinds = ["snapshot"] if repo else None
+        entries = self.catalog.sorted(kinds)
         print("Available backups:")
-        print(result.stdout)
+        if not entries:
+            print("No backups found")
+            return
+        
+        print(f"{'Name':<36}{'Kind':<10}{'Created':<21}{'Size':>10}{'Ratio':>7}{'Time':>8}{'Speed':>11}  SHA256")
+        for entry in entries:
+            created = datetime.datetime.fromtimestamp(entry["created"]).strftime("%Y-%m-%d %H:%M:%S")
+            size = format_bytes(entry["size"]) if entry["size"] is not None else "-"
+            ratio = f"{entry['compression_ratio']}x" if entry.get("compression_ratio") else "-"
+            duration = f"{entry['duration']:.0f}s" if entry.get("duration") else "-"
+            speed = f"{format_bytes(entry['throughput'])}/s" if entry.get("throughput") else "-"
+            digest = (entry.get("sha256") or "-")[:12]
+            print(f"{entry['name']:<36}{entry['kind']:<10}{created:<21}{size:>10}{ratio:>7}{duration:>8}{speed:>11}  {digest}")
 
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Database backup management')
-    parser.add_argument('action', choices=['backup', 'restore', 'list'], help='Action to perform')
+    parser.add_argument('action', choices=['backup', 'restore', 'list', 'wal-setup', 'basebackup'], help='Action to perform')
     parser.add_argument('--file', help='Backup file name for restore')
     parser.add_argument('--host', default='forest-vps', help='VPS hostname')
     parser.add_argument('--user', default='root', help='SSH user')
+    parser.add_argument('--project-dir', default='/opt/wms', help='Project directory on VPS')
+    parser.add_argument('--codec', default='gzip', choices=list(CODECS), help='Compression codec for new backups')
+    parser.add_argument('--level', type=int, help='Compression level (codec default if omitted)')
+    parser.add_argument('--local-dir', help='Stream the backup to this local directory instead of the VPS')
+    parser.add_argument('--jobs', type=int, default=1, help='Parallel pg_dump/pg_restore jobs (uses directory format when > 1)')
+    parser.add_argument('--repo', action='store_true', help='Use the deduplicating snapshot repository')
+    parser.add_argument('--latest', action='store_true', help='Restore the most recent backup in the catalog')
+    parser.add_argument('--to', help='Point-in-time restore target, e.g. "2026-10-18 14:05+07:00" (database server time zone if no offset)')
+    parser.add_argument('--rescan', action='store_true', help='Rebuild the local catalog from the VPS before listing')
+    parser.add_argument('--keep-hourly', type=int, default=24, help='Hourly backups to keep')
+    parser.add_argument('--keep-daily', type=int, default=7, help='Daily backups to keep')
+    parser.add_argument('--keep-weekly', type=int, default=4, help='Weekly backups to keep')
     
     args = parser.parse_args()
     
-    backup_manager = DatabaseBackup(args.host, args.user)
+    backup_manager = DatabaseBackup(args.host, args.user, args.project_dir, keep_hourly=args.keep_hourly,
+                                    keep_daily=args.keep_daily, keep_weekly=args.keep_weekly)
     
     if args.action == 'backup':
-        backup_manager.create_backup()
+        backup_manager.create_backup(args.codec, args.level, args.local_dir, args.jobs, args.repo)
     elif args.action == 'restore':
+        if args.to:
+            backup_manager.restore_to_time(args.to)
+            return
+        if args.latest:
+            entry = backup_manager.catalog.latest(["snapshot"] if args.repo else ["sql", "dir", "snapshot"])
+            if not entry:
+                print("Error: the catalog has no backups on the VPS (try: list --rescan)")
+                sys.exit(1)
+            args.file, args.repo = entry["name"], entry["kind"] == "snapshot"
         if not args.file:
-            print("Error: --file is required for restore action")
+            print("Error: --file, --latest or --to is required for restore action")
             sys.exit(1)
-        backup_manager.restore_backup(args.file)
+        backup_manager.restore_backup(args.file, args.jobs, args.repo)
     elif args.action == 'list':
-        backup_manager.list_backups()
+        backup_manager.list_backups(args.repo, args.rescan)
+    elif args.action == 'wal-setup':
+        backup_manager.setup_wal_archiving()
+    elif args.action == 'basebackup':
+        backup_manager.create_base_backup()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
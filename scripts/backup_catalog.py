@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import tempfile
+import datetime
+
+
+class BackupCatalog:
+    """Local JSON index of every backup taken for one host.
+
+    Entries are keyed by location, so a download and its VPS twin can
+    share a name. Each entry records where a backup lives and what it
+    cost to make: name, location, kind (sql, dir, snapshot or local),
+    created (epoch seconds), size, raw_size, codec, duration,
+    throughput, sha256 and db_version.
+    The file is rewritten atomically, so a crash never leaves it half
+    written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = {entry["location"]: entry for entry in json.load(f)}
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix=".catalog-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.sorted(), f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def add(self, entry):
+        self.entries[entry["location"]] = entry
+        self.save()
+
+    def remove(self, locations):
+        for location in locations:
+            self.entries.pop(location, None)
+        self.save()
+
+    def sorted(self, kinds=None):
+        """Entries oldest first, optionally restricted to some kinds"""
+        entries = [e for e in self.entries.values() if kinds is None or e["kind"] in kinds]
+        return sorted(entries, key=lambda e: e["created"])
+
+    def latest(self, kinds=None):
+        entries = self.sorted(kinds)
+        return entries[-1] if entries else None
+
+
+def select_expired(entries, keep_hourly=24, keep_daily=7, keep_weekly=4):
+    """Return entries outside every retention tier.
+
+    Walking newest first, the newest backup in each of the latest
+    keep_hourly hours, keep_daily days and keep_weekly ISO weeks that
+    have a backup is kept.
+    """
+    tiers = [
+        (keep_hourly, lambda t: t.strftime("%Y-%m-%d %H")),
+        (keep_daily, lambda t: t.strftime("%Y-%m-%d")),
+        (keep_weekly, lambda t: "%d-W%02d" % t.isocalendar()[:2]),
+    ]
+    kept = set()
+    for limit, bucket_of in tiers:
+        buckets = set()
+        for entry in sorted(entries, key=lambda e: e["created"], reverse=True):
+            bucket = bucket_of(datetime.datetime.fromtimestamp(entry["created"]))
+            if bucket in buckets:
+                continue
+            if len(buckets) >= limit:
+                break
+            buckets.add(bucket)
+            kept.add(entry["location"])
+    return [entry for entry in entries if entry["location"] not in kept]
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""Benchmark the ops scripts against a seeded database.
+
+Generates a pg_dump-style SQL file shaped like backend/prisma/seed.ts
+(users, contracts, product serials, tickets, ticket and warranty history)
+at a configurable scale, loads it into the target's database, then runs
+each action as a subprocess and records its wall time, remote command
+count and bytes moved (from the transport's WMS_TRANSPORT_STATS line).
+Backup and restore also report MB/s against the seeded data size.
+
+Results are appended to ``<state dir>/benchmark-history.jsonl`` and every
+run is compared with the median of earlier runs at the same scale.
+
+    python3 scripts/benchmark.py --scale 10
+    python3 scripts/benchmark.py --scale 50 --latency 0.03 --actions status,backup,restore
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import datetime
+import statistics
+import subprocess
+from pathlib import Path
+
+from transport import transport_for, local_state_dir
+from timing import format_bytes, current_release, HISTORY_WINDOW
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Action -> command line, run in this order; deploy first so the project exists before seeding
+ACTIONS = {
+    "deploy": [ROOT / "deploy.py", "--skip-nginx"],
+    "status": [ROOT / "scripts" / "monitor.py", "status"],
+    "backup": [ROOT / "scripts" / "backup.py", "backup"],
+    "restore": [ROOT / "scripts" / "backup.py", "restore", "--latest"],
+}
+# Actions whose throughput is reported against the seeded data size
+THROUGHPUT_ACTIONS = {"backup", "restore"}
+
+# Rows per unit of --scale; tickets and history hang off product serials
+ROWS_PER_SCALE = {"contracts": 100, "product_serials": 400, "tickets": 200}
+
+TRANSPORT_LINE = re.compile(
+    r"\[TRANSPORT\] \S+ \S+: (\d+) round-trips, [\d.]+s, (\d+) bytes sent, (\d+) bytes received"
+)
+
+CUSTOMERS = ["Công ty TNHH ABC", "Tập đoàn XYZ", "Công ty CP Công nghệ DEF", "Ngân hàng GHI", "Bệnh viện JKL"]
+PRODUCTS = [
+    ("HP LaserJet Pro 4015n", "CE527A", "Máy in"),
+    ("Dell Latitude 7520", "LAT7520", "Laptop"),
+    ("Canon imageRUNNER 2630i", "IR2630I", "Máy photocopy"),
+    ("HP EliteDesk 800 G9", "800G9", "Desktop"),
+    ("Dell PowerEdge R750", "R750", "Server"),
+    ("Cisco Catalyst 2960-X", "WS-C2960X", "Network"),
+]
+ISSUES = [
+    "Máy in ra bản in bị mờ, có vệt đen dọc trang giấy",
+    "Laptop không khởi động được sau khi cập nhật Windows",
+    "Máy photocopy báo lỗi E000020-0001 liên tục",
+    "Server báo lỗi ECC trên thanh RAM, hệ thống tự khởi động lại",
+    "Switch mất kết nối ở một số cổng, đèn báo màu cam",
+]
+ROLES = ["admin", "manager", "technician"]
+CONTRACT_STATUSES = ["active", "active", "active", "expired", "pending", "cancelled"]
+PRIORITIES = ["low", "medium", "high", "urgent"]
+TICKET_STATUSES = ["new", "received", "in_progress", "resolved", "closed"]
+ACTION_TYPES = ["created", "updated", "status_changed", "assigned", "priority_changed", "resolved"]
+
+COLUMNS = {
+    "users": ["id", "email", "password_hash", "full_name", "role", "is_active", "created_at", "updated_at"],
+    "contracts": ["id", "contract_number", "customer_name", "customer_email", "customer_phone", "customer_address",
+                  "start_date", "end_date", "terms_conditions", "status", "created_by", "created_at", "updated_at"],
+    "product_serials": ["id", "serial_number", "name", "model", "category", "description", "warranty_months",
+                        "contract_id", "manufacture_date", "purchase_date", "warranty_status", "is_active", "notes",
+                        "created_at", "updated_at"],
+    "tickets": ["id", "ticket_number", "product_serial_id", "customer_name", "customer_email", "customer_phone",
+                "issue_description", "issue_title", "priority", "status", "assigned_to", "created_at", "updated_at",
+                "resolved_at"],
+    "ticket_history": ["id", "ticket_id", "action_type", "description", "old_value", "new_value", "performed_by",
+                       "created_at"],
+    "warranty_history": ["id", "product_serial_id", "action_type", "description", "cost", "performed_by",
+                         "performed_at"],
+}
+
+
+def copy_value(value):
+    """Format a value for a COPY ... FROM stdin row"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+class SeedGenerator:
+    """Deterministic rows shaped like the Prisma seed, scaled up"""
+
+    def __init__(self, scale, seed=0):
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.epoch = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def uuid(self):
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def timestamp(self, days=730):
+        return (self.epoch + datetime.timedelta(seconds=self.rng.randrange(days * 86400))).isoformat()
+
+    def date(self, days=730):
+        return (self.epoch.date() + datetime.timedelta(days=self.rng.randrange(days))).isoformat()
+
+    def users(self):
+        for n in range(4 + self.scale):
+            yield [self.uuid(), f"user{n}@foresttruong.info", "$2b$10$" + "x" * 53, f"Nhân viên {n}",
+                   ROLES[min(n, 2)], True, self.timestamp(), self.timestamp()]
+
+    def contracts(self, user_ids):
+        for n in range(ROWS_PER_SCALE["contracts"] * self.scale):
+            customer = self.rng.choice(CUSTOMERS)
+            start = self.date()
+            end = (datetime.date.fromisoformat(start) + datetime.timedelta(days=365 * self.rng.randint(1, 3))).isoformat()
+            yield [self.uuid(), f"HD-2024-{n + 1:06d}", customer, f"contact{n}@example.vn", f"09{self.rng.randrange(10**8):08d}",
+                   f"{self.rng.randint(1, 500)} Nguyễn Huệ, Quận 1, TP.HCM", start, end,
+                   "Bảo hành theo tiêu chuẩn nhà sản xuất, hỗ trợ kỹ thuật 24/7",
+                   self.rng.choice(CONTRACT_STATUSES), self.rng.choice(user_ids), self.timestamp(), self.timestamp()]
+
+    def product_serials(self, contract_ids):
+        for n in range(ROWS_PER_SCALE["product_serials"] * self.scale):
+            name, model, category = self.rng.choice(PRODUCTS)
+            yield [self.uuid(), f"SN{model}{n:08d}", name, model, category, f"{name} - {category} văn phòng",
+                   self.rng.choice([12, 24, 36]), self.rng.choice(contract_ids), self.date(), self.date(),
+                   self.rng.choice(["valid", "valid", "valid", "expired"]), True, None,
+                   self.timestamp(), self.timestamp()]
+
+    def tickets(self, serial_ids, user_ids):
+        for n in range(ROWS_PER_SCALE["tickets"] * self.scale):
+            status = self.rng.choice(TICKET_STATUSES)
+            issue = self.rng.choice(ISSUES)
+            resolved = self.timestamp() if status in ("resolved", "closed") else None
+            yield [self.uuid(), f"TK-2024-{n + 1:06d}", self.rng.choice(serial_ids), self.rng.choice(CUSTOMERS),
+                   f"contact{n}@example.vn", f"09{self.rng.randrange(10**8):08d}", issue, issue[:60],
+                   self.rng.choice(PRIORITIES), status, self.rng.choice(user_ids), self.timestamp(),
+                   self.timestamp(), resolved]
+
+    def ticket_history(self, ticket_ids, user_ids):
+        for ticket_id in ticket_ids:
+            for _ in range(self.rng.randint(1, 5)):
+                yield [self.uuid(), ticket_id, self.rng.choice(ACTION_TYPES),
+                       "Đã kiểm tra thiết bị và cập nhật tình trạng xử lý", "received", "in_progress",
+                       self.rng.choice(user_ids), self.timestamp()]
+
+    def warranty_history(self, serial_ids, user_ids):
+        for serial_id in serial_ids:
+            if self.rng.random() < 0.5:
+                yield [self.uuid(), serial_id, self.rng.choice(["created", "updated"]),
+                       "Yêu cầu bảo hành, đã gửi ảnh chụp và log lỗi từ thiết bị",
+                       f"{self.rng.randint(5, 100) * 100000}.00", self.rng.choice(user_ids), self.timestamp()]
+
+    def write(self, path):
+        """Write the SQL file and return row counts per table"""
+        counts = {}
+        with open(path, "w") as f:
+            f.write("-- WMS benchmark data, generated by scripts/benchmark.py\n")
+            f.write(f"TRUNCATE {', '.join(COLUMNS)} CASCADE;\n\n")
+
+            def copy(table, rows):
+                ids = []
+                f.write(f"COPY public.{table} ({', '.join(COLUMNS[table])}) FROM stdin;\n")
+                for row in rows:
+                    ids.append(row[0])
+                    f.write("\t".join(copy_value(v) for v in row) + "\n")
+                f.write("\\.\n\n")
+                counts[table] = len(ids)
+                return ids
+
+            user_ids = copy("users", self.users())
+            contract_ids = copy("contracts", self.contracts(user_ids))
+            serial_ids = copy("product_serials", self.product_serials(contract_ids))
+            ticket_ids = copy("tickets", self.tickets(serial_ids, user_ids))
+            copy("ticket_history", self.ticket_history(ticket_ids, user_ids))
+            copy("warranty_history", self.warranty_history(serial_ids, user_ids))
+        return counts
+
+
+class Benchmark:
+    def __init__(self, host, user, project_dir, scale, seed=0):
+        self.host = host
+        self.user = user
+        self.project_dir = project_dir
+        self.scale = scale
+        self.seed = seed
+        self.state_dir = local_state_dir(host)
+        self.history_path = self.state_dir / "benchmark-history.jsonl"
+
+    def prepare_seed(self):
+        """Generate (or reuse) the SQL file for this scale and seed"""
+        path = self.state_dir / f"benchmark-seed-{self.scale}-{self.seed}.sql"
+        counts_path = path.with_suffix(".json")
+        if path.exists() and counts_path.exists():
+            return path, json.loads(counts_path.read_text())
+        print(f"Generating seed data at scale {self.scale}...")
+        counts = SeedGenerator(self.scale, self.seed).write(path)
+        counts_path.write_text(json.dumps(counts))
+        return path, counts
+
+    def load_seed(self, path):
+        """Replace the target database with the seed data"""
+        transport = transport_for(self.host, self.user)
+        command = (f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml "
+                   f"exec -T postgres psql -q -U postgres -d wms_db")
+        started = time.monotonic()
+        with open(path, "rb") as f:
+            process = transport.open(command, stdin=f, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            _, stderr = process.communicate()
+        if process.returncode != 0:
+            print(f"Error: seeding failed: {stderr.decode(errors='replace')}")
+            sys.exit(1)
+        transport.close()
+        return time.monotonic() - started
+
+    def run_action(self, name):
+        script, *args = ACTIONS[name]
+        command = [sys.executable, str(script), *args, "--host", self.host, "--user", self.user]
+        if name == "deploy":
+            command += ["--project-dir", self.project_dir]
+        env = dict(os.environ, WMS_TRANSPORT_STATS="1")
+        started = time.monotonic()
+        result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, env=env)
+        seconds = time.monotonic() - started
+
+        round_trips = bytes_out = bytes_in = 0
+        for match in TRANSPORT_LINE.finditer(result.stderr):
+            round_trips += int(match.group(1))
+            bytes_out += int(match.group(2))
+            bytes_in += int(match.group(3))
+        if result.returncode != 0:
+            print(result.stdout[-2000:] + result.stderr[-2000:])
+        return {"seconds": seconds, "returncode": result.returncode, "round_trips": round_trips,
+                "bytes_out": bytes_out, "bytes_in": bytes_in}
+
+    def load_history(self):
+        """Earlier successful runs at the same scale and transport, oldest first"""
+        runs = []
+        try:
+            with open(self.history_path) as f:
+                for line in f:
+                    run = json.loads(line)
+                    if run["scale"] == self.scale and run["transport"] == self.transport_name():
+                        runs.append(run)
+        except FileNotFoundError:
+            pass
+        return runs[-HISTORY_WINDOW:]
+
+    def transport_name(self):
+        return os.environ.get("WMS_TRANSPORT", "ssh")
+
+    def run(self, actions):
+        seed_path, counts = self.prepare_seed()
+        db_bytes = seed_path.stat().st_size
+        rows = sum(counts.values())
+        print(f"Seed: {rows} rows, {format_bytes(db_bytes)} ({', '.join(f'{t} {n}' for t, n in counts.items())})")
+
+        history = self.load_history()
+        record = {
+            "started": datetime.datetime.now().isoformat(timespec="seconds"),
+            "release": current_release(),
+            "host": self.host,
+            "transport": self.transport_name(),
+            "latency": float(os.environ.get("WMS_LOCAL_LATENCY", "0")),
+            "scale": self.scale,
+            "rows": counts,
+            "db_bytes": db_bytes,
+            "actions": {},
+        }
+
+        for name in ACTIONS:
+            if name not in actions:
+                continue
+            if name != "deploy" and "seed_seconds" not in record:
+                record["seed_seconds"] = self.load_seed(seed_path)
+            print(f"Running {name}...")
+            result = self.run_action(name)
+            if name in THROUGHPUT_ACTIONS:
+                result["mb_per_s"] = db_bytes / 1024 / 1024 / result["seconds"]
+            record["actions"][name] = result
+            if result["returncode"] != 0:
+                print(f"Error: {name} exited with {result['returncode']}")
+                break
+
+        with open(self.history_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self.print_summary(record, history)
+        return all(a["returncode"] == 0 for a in record["actions"].values())
+
+    def print_summary(self, record, history):
+        print(f"\n=== Benchmark: scale {self.scale}, {record['transport']} transport ===")
+        print(f"{'Action':<10}{'Time':>9}{'Cmds':>6}{'Sent':>10}{'Recv':>10}{'MB/s':>8}  vs median")
+        for name, result in record["actions"].items():
+            previous = [run["actions"][name]["seconds"] for run in history
+                        if run["actions"].get(name, {}).get("returncode") == 0]
+            if result["returncode"] != 0:
+                comparison = "FAILED"
+            elif previous:
+                median = statistics.median(previous)
+                comparison = f"{result['seconds'] - median:+.2f}s ({len(previous)} runs)"
+            else:
+                comparison = "-"
+            throughput = f"{result['mb_per_s']:.1f}" if "mb_per_s" in result else "-"
+            print(f"{name:<10}{result['seconds']:>8.2f}s{result['round_trips']:>6}"
+                  f"{format_bytes(result['bytes_out']):>10}{format_bytes(result['bytes_in']):>10}"
+                  f"{throughput:>8}  {comparison}")
+        print(f"History: {self.history_path}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark WMS ops scripts against a seeded database')
+    parser.add_argument('--host', default='bench', help='Target host (a local fake VPS unless --transport ssh)')
+    parser.add_argument('--user', default='root', help='SSH user')
+    parser.add_argument('--project-dir', default='/opt/wms', help='Project directory on the target')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='Data size: 100 contracts, 400 product serials and 200 tickets per unit')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated data')
+    parser.add_argument('--actions', default=','.join(ACTIONS), help='Comma-separated actions to run')
+    parser.add_argument('--transport', default='local', choices=['local', 'ssh'], help='How to reach the target')
+    parser.add_argument('--latency', type=float, help='Seconds added per round-trip by the local transport')
+    parser.add_argument('--replace-data', action='store_true',
+                        help='Allow seeding over a real database (required with --transport ssh)')
+
+    args = parser.parse_args()
+
+    actions = args.actions.split(',')
+    unknown = set(actions) - set(ACTIONS)
+    if unknown:
+        parser.error(f"unknown actions: {', '.join(sorted(unknown))}")
+    if args.transport == 'ssh' and not args.replace_data:
+        parser.error("--transport ssh replaces the target's database; pass --replace-data to confirm")
+
+    os.environ["WMS_TRANSPORT"] = args.transport
+    if args.latency is not None:
+        os.environ["WMS_LOCAL_LATENCY"] = str(args.latency)
+
+    benchmark = Benchmark(args.host, args.user, args.project_dir, args.scale, args.seed)
+    sys.exit(0 if benchmark.run(actions) else 1)
+
+
+if __name__ == "__main__":
+    main()
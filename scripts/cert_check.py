@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""TLS certificate checks for monitor.py, made from the monitor process.
+
+Each domain gets a verified handshake with Python's ssl module (no SSH,
+no openssl pipes) and the peer certificate's expiry is turned into days
+remaining. A certificate that fails verification is read again without
+it, so an expired one still reports its (negative) days left. Results
+are cached per domain for ``ttl`` seconds, failures for at most
+FAILURE_TTL, so watch mode and the exporter only re-handshake when an
+entry expires.
+"""
+
+import ssl
+import time
+import socket
+import threading
+from datetime import datetime, timezone
+
+# Failed checks are retried sooner than good ones
+FAILURE_TTL = 300
+# Certificates closer than this to expiry are reported as a warning
+WARN_DAYS = 14
+
+# Issuer attributes getpeercert() names, by DER-encoded OID
+ISSUER_OIDS = {b"\x55\x04\x0a": "organizationName", b"\x55\x04\x03": "commonName"}
+
+
+class CertificateError(Exception):
+    pass
+
+
+def der_children(data, start=0, end=None):
+    """(tag, content start, content end) of each DER element in data[start:end]"""
+    end = len(data) if end is None else end
+    while start < end:
+        tag, length = data[start], data[start + 1]
+        start += 2
+        if length & 0x80:
+            count = length & 0x7F
+            length = int.from_bytes(data[start:start + count], "big")
+            start += count
+        yield tag, start, start + length
+        start += length
+
+
+def parse_der_time(tag, value):
+    """UTCTime (tag 0x17) or GeneralizedTime (0x18) as an aware datetime"""
+    text = value.decode("ascii")
+    fmt = "%y%m%d%H%M%SZ" if tag == 0x17 else "%Y%m%d%H%M%SZ"
+    return datetime.strptime(text, fmt).replace(tzinfo=timezone.utc)
+
+
+def parse_der_certificate(der):
+    """notBefore, notAfter and issuer of a DER certificate, as getpeercert() would report them"""
+    _, start, end = next(der_children(der))
+    _, tbs_start, tbs_end = next(der_children(der, start, end))
+    fields = list(der_children(der, tbs_start, tbs_end))
+    # Skip the optional [0] version; then serial, signature algorithm, issuer, validity
+    if fields[0][0] == 0xA0:
+        fields = fields[1:]
+    _, issuer_start, issuer_end = fields[2]
+    _, validity_start, validity_end = fields[3]
+    not_before, not_after = (parse_der_time(tag, der[s:e]) for tag, s, e in der_children(der, validity_start, validity_end))
+    issuer = {}
+    for _, rdn_start, rdn_end in der_children(der, issuer_start, issuer_end):
+        for _, attr_start, attr_end in der_children(der, rdn_start, rdn_end):
+            (_, oid_start, oid_end), (_, value_start, value_end) = der_children(der, attr_start, attr_end)
+            name = ISSUER_OIDS.get(der[oid_start:oid_end])
+            if name:
+                issuer[name] = der[value_start:value_end].decode("utf-8", errors="replace")
+    return not_before, not_after, issuer
+
+
+def certificate_details(not_before, not_after, issuer, error=None):
+    return {
+        "not_before": not_before,
+        "not_after": not_after,
+        "days_left": (not_after - datetime.now(timezone.utc)).total_seconds() / 86400,
+        "issuer": issuer.get("organizationName") or issuer.get("commonName"),
+        # Why verification failed, e.g. "certificate has expired"; None for a valid certificate
+        "error": error,
+    }
+
+
+def fetch_unverified(domain, port, timeout, error):
+    """Details of a certificate that failed verification, so its expiry is still known"""
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    try:
+        with socket.create_connection((domain, port), timeout=timeout) as sock:
+            with context.wrap_socket(sock, server_hostname=domain) as tls:
+                der = tls.getpeercert(binary_form=True)
+        return certificate_details(*parse_der_certificate(der), error=error)
+    except (OSError, ssl.SSLError, ValueError, IndexError, StopIteration):
+        raise CertificateError(error)
+
+
+def fetch_certificate(domain, port=443, timeout=10):
+    """Handshake with the domain and return its certificate details.
+
+    A certificate that fails verification is fetched again without it;
+    its details then carry the verification error.
+    """
+    context = ssl.create_default_context()
+    try:
+        with socket.create_connection((domain, port), timeout=timeout) as sock:
+            with context.wrap_socket(sock, server_hostname=domain) as tls:
+                cert = tls.getpeercert()
+    except ssl.SSLCertVerificationError as e:
+        return fetch_unverified(domain, port, timeout, e.verify_message or str(e))
+    except (OSError, ssl.SSLError) as e:
+        raise CertificateError(str(e))
+
+    issuer = dict(field for rdn in cert.get("issuer", ()) for field in rdn)
+    return certificate_details(
+        datetime.fromtimestamp(ssl.cert_time_to_seconds(cert["notBefore"]), timezone.utc),
+        datetime.fromtimestamp(ssl.cert_time_to_seconds(cert["notAfter"]), timezone.utc),
+        issuer,
+    )
+
+
+class CertificateCache:
+    """Certificate details per domain, refreshed once their TTL runs out"""
+
+    def __init__(self, ttl=3600, timeout=10):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, domain):
+        """Cached details for the domain, or raise CertificateError if there is no certificate to read"""
+        with self.lock:
+            entry = self.entries.get(domain)
+        if entry is None or entry[0] <= time.monotonic():
+            try:
+                details = fetch_certificate(domain, timeout=self.timeout)
+                entry = (time.monotonic() + (min(self.ttl, FAILURE_TTL) if details["error"] else self.ttl), details)
+            except CertificateError as e:
+                entry = (time.monotonic() + min(self.ttl, FAILURE_TTL), e)
+            with self.lock:
+                self.entries[domain] = entry
+        result = entry[1]
+        if isinstance(result, CertificateError):
+            raise result
+        # Days left keep counting down while the entry is cached
+        return dict(result, days_left=(result["not_after"] - datetime.now(timezone.utc)).total_seconds() / 86400)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Prometheus text-format exporter for monitor.py serve.
+
+A background thread runs the monitor's probes every ``interval`` seconds
+and renders the results once; scrapes only read that cached text, so any
+number of scrapers costs one round of probes per interval.
+"""
+
+import time
+import threading
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# name -> (type, help)
+METRIC_HELP = {
+    "wms_collect_success": ("gauge", "Whether the host snapshot was collected in the last round"),
+    "wms_collect_timestamp_seconds": ("gauge", "Unix time the last collection round finished"),
+    "wms_collect_duration_seconds": ("gauge", "Wall time of the last collection round"),
+    "wms_probe_success": ("gauge", "Whether a probe completed in the last round"),
+    "wms_probe_duration_seconds": ("gauge", "Wall time of each probe in the last round"),
+    "wms_service_up": ("gauge", "Whether the compose service container is running"),
+    "wms_service_healthy": ("gauge", "Whether the container health check passes (1 when it has none)"),
+    "wms_service_restarts": ("gauge", "Container restart count"),
+    "wms_http_up": ("gauge", "Whether the endpoint answered 200"),
+    "wms_http_status_code": ("gauge", "HTTP status code of the endpoint check"),
+    "wms_http_check_seconds": ("gauge", "Latency of the endpoint check, including the remote round-trip"),
+    "wms_postgres_up": ("gauge", "Whether pg_isready succeeds"),
+    "wms_redis_up": ("gauge", "Whether redis-cli ping answers PONG"),
+    "wms_cpu_percent": ("gauge", "Host CPU usage"),
+    "wms_load1": ("gauge", "Host 1-minute load average"),
+    "wms_memory_used_bytes": ("gauge", "Host memory in use"),
+    "wms_memory_total_bytes": ("gauge", "Host memory size"),
+    "wms_disk_used_percent": ("gauge", "Root filesystem usage"),
+    "wms_ssl_cert_expiry_days": ("gauge", "Days until the certificate served for the domain expires"),
+    "wms_ssl_cert_valid": ("gauge", "Whether the certificate served for the domain passes verification"),
+}
+
+ENDPOINTS = {"health.backend": "backend", "health.frontend": "frontend"}
+
+
+def timed(probe):
+    """Wrap a probe so it returns (seconds, result)"""
+    started = time.monotonic()
+    result = probe()
+    return time.monotonic() - started, result
+
+
+def render(samples):
+    """Prometheus text exposition for [(name, labels, value)]"""
+    by_name = {}
+    for name, labels, value in samples:
+        by_name.setdefault(name, []).append((labels, value))
+    lines = []
+    for name, series in by_name.items():
+        kind, text = METRIC_HELP[name]
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """Collects monitor probes on a schedule and serves the last result"""
+
+    def __init__(self, monitor, interval=30):
+        self.monitor = monitor
+        self.interval = interval
+        self.body = render([("wms_collect_success", {}, 0)])
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def probes(self):
+        probes = {}
+        probes.update(self.monitor.snapshot_probes())
+        probes.update(self.monitor.health_probes())
+        probes.update(self.monitor.ssl_probes())
+        return {name: partial(timed, probe) for name, probe in probes.items()}
+
+    def collect(self):
+        """Run every probe once and return the samples"""
+        started = time.monotonic()
+        results = self.monitor.probe_engine.run(self.probes())
+        samples = []
+        values = {}
+        for name, result in results.items():
+            # Probes that raised or timed out come back as ProbeFailure, not (seconds, result)
+            failed = not isinstance(result, tuple)
+            samples.append(("wms_probe_success", {"probe": name}, 0 if failed else 1))
+            if not failed:
+                seconds, values[name] = result
+                samples.append(("wms_probe_duration_seconds", {"probe": name}, seconds))
+
+        snapshot = values.get("snapshot")
+        samples.append(("wms_collect_success", {}, 1 if snapshot else 0))
+        if snapshot:
+            for service in self.monitor.services:
+                state = snapshot["services"].get(service)
+                running = state is not None and state["status"] == "running"
+                samples.append(("wms_service_up", {"service": service}, 1 if running else 0))
+                samples.append(("wms_service_healthy", {"service": service},
+                                1 if running and state["health"] in (None, "healthy") else 0))
+                if state is not None:
+                    samples.append(("wms_service_restarts", {"service": service}, state["restart_count"]))
+            samples += [
+                ("wms_cpu_percent", {}, snapshot["cpu_percent"]),
+                ("wms_load1", {}, snapshot["load_average"][0]),
+                ("wms_memory_used_bytes", {}, snapshot["memory"]["used"]),
+                ("wms_memory_total_bytes", {}, snapshot["memory"]["total"]),
+                ("wms_disk_used_percent", {}, snapshot["disk"]["percent"]),
+            ]
+
+        for name, endpoint in ENDPOINTS.items():
+            if name in values:
+                code = values[name]
+                samples.append(("wms_http_up", {"endpoint": endpoint}, 1 if code == "200" else 0))
+                samples.append(("wms_http_status_code", {"endpoint": endpoint}, int(code) if code.isdigit() else 0))
+                samples.append(("wms_http_check_seconds", {"endpoint": endpoint}, results[name][0]))
+            else:
+                samples.append(("wms_http_up", {"endpoint": endpoint}, 0))
+        samples.append(("wms_postgres_up", {}, 1 if values.get("health.database") else 0))
+        samples.append(("wms_redis_up", {}, 1 if values.get("health.redis") else 0))
+
+        for domain in self.monitor.domains:
+            cert = values.get(f"ssl.{domain}")
+            if cert is not None:
+                samples.append(("wms_ssl_cert_expiry_days", {"domain": domain}, round(cert["days_left"], 2)))
+                samples.append(("wms_ssl_cert_valid", {"domain": domain}, 0 if cert["error"] else 1))
+
+        samples.append(("wms_collect_duration_seconds", {}, time.monotonic() - started))
+        samples.append(("wms_collect_timestamp_seconds", {}, time.time()))
+        return samples
+
+    def collect_loop(self):
+        while not self.stopped.is_set():
+            started = time.monotonic()
+            try:
+                body = render(self.collect())
+            except Exception as e:
+                print(f"⚠ Collection failed: {e}")
+            else:
+                with self.lock:
+                    self.body = body
+            self.stopped.wait(max(self.interval - (time.monotonic() - started), 0))
+
+    def handler(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                with exporter.lock:
+                    body = exporter.body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve(self, bind="127.0.0.1", port=9105):
+        """Start collecting in the background and serve /metrics until interrupted"""
+        server = ThreadingHTTPServer((bind, port), self.handler())
+        threading.Thread(target=self.collect_loop, daemon=True).start()
+        print(f"Serving metrics on http://{bind}:{port}/metrics (collecting every {self.interval}s)")
+        print("Press Ctrl+C to stop")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nExporter stopped.")
+        finally:
+            self.stopped.set()
+            server.server_close()
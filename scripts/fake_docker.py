@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Stand-in for docker, docker-compose, curl and ssh used by LocalTransport.
+
+Installed as wrapper scripts on the PATH of locally executed "remote"
+commands, so the ops scripts can run end to end without a VPS; system
+tools such as apt and systemctl are routed to a no-op. Container
+state lives in ``$FAKE_DOCKER_ROOT/.fake-docker.json`` and the database is
+a plain SQL file, ``$FAKE_DOCKER_ROOT/.fake-db.sql``: pg_dump prints it and
+psql replaces it with whatever is piped in. Paths inside the postgres
+container under /backup resolve to ``<project dir>/backup``, as with the
+real volume.
+
+FAKE_DOCKER_DELAY (seconds) is slept by slow operations such as build,
+up and restart, to model their cost.
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import random
+import datetime
+import tarfile
+import subprocess
+
+SERVICES = ["postgres", "redis", "backend", "frontend"]
+SERVER_VERSION = "15.4"
+START_WAL = "000000010000000000000002"
+
+
+def delay():
+    time.sleep(float(os.environ.get("FAKE_DOCKER_DELAY", "0")))
+
+
+class FakeProject:
+    def __init__(self, compose_file):
+        self.dir = os.path.dirname(os.path.abspath(compose_file))
+        root = os.environ.get("FAKE_DOCKER_ROOT", self.dir)
+        self.state_path = os.path.join(root, ".fake-docker.json")
+        self.db_path = os.path.join(root, ".fake-db.sql")
+
+    def load(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, state):
+        with open(self.state_path, "w") as f:
+            json.dump(state, f)
+
+    def set_status(self, services, status):
+        state = self.load()
+        for service in services or SERVICES:
+            if status is None:
+                state.pop(service, None)
+                continue
+            entry = state.setdefault(service, {"restart_count": 0})
+            if status == "running" and entry.get("status") != "running":
+                entry["started_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            entry["status"] = status
+        self.save(state)
+
+    def container_path(self, path):
+        return os.path.join(self.dir, path[1:]) if path.startswith("/backup") else path
+
+
+def container_id(service):
+    return f"fake-{service}"
+
+
+def exec_in_container(project, service, args):
+    program, rest = args[0], args[1:]
+    if program == "pg_dump":
+        if "-f" in rest:
+            target = project.container_path(rest[rest.index("-f") + 1])
+            os.makedirs(target, exist_ok=True)
+            with open(os.path.join(target, "toc.dat"), "wb") as out, open_db(project) as db:
+                out.write(db.read())
+            return 0
+        with open_db(project) as db:
+            while True:
+                block = db.read(1024 * 1024)
+                if not block:
+                    break
+                sys.stdout.buffer.write(block)
+        return 0
+    if program == "psql":
+        query = next((rest[i + 1] for i, a in enumerate(rest) if a in ("-c", "-tAc")), None)
+        if query is None:
+            # Restore: the piped SQL becomes the database
+            with open(project.db_path, "wb") as db:
+                for block in iter(lambda: sys.stdin.buffer.read(1024 * 1024), b""):
+                    db.write(block)
+            return 0
+        if "server_version" in query:
+            print(SERVER_VERSION)
+        elif "pg_is_in_recovery" in query:
+            print("f")
+        return 0
+    if program == "pg_basebackup":
+        target = project.container_path(rest[rest.index("-D") + 1])
+        os.makedirs(target, exist_ok=True)
+        label = f"START WAL LOCATION: 0/2000028 (file {START_WAL})\n".encode()
+        with tarfile.open(os.path.join(target, "base.tar.gz"), "w:gz") as archive:
+            info = tarfile.TarInfo("backup_label")
+            info.size = len(label)
+            archive.addfile(info, io.BytesIO(label))
+            if os.path.exists(project.db_path):
+                archive.add(project.db_path, arcname="base/fake-db.sql")
+        return 0
+    if program == "redis-cli":
+        print("PONG")
+        return 0
+    if program == "sh":
+        return 0
+    # pg_isready, pg_restore, pg_archivecleanup, mkdir, chown ...
+    return 0
+
+
+def open_db(project):
+    if os.path.exists(project.db_path):
+        return open(project.db_path, "rb")
+    return io.BytesIO(b"-- empty fake database\n")
+
+
+def parse_rfc3339(value):
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def fake_log_line(service, n, timestamp, timestamps):
+    level = "ERROR" if n % 7 == 3 else "WARN" if n % 5 == 2 else "LOG"
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp)) + f".{int(timestamp % 1 * 1e9):09d}Z "
+    return f"{service}  | {stamp if timestamps else ''}{level} fake log line {n}"
+
+
+def compose(args):
+    compose_file = "docker-compose.yml"
+    while args and args[0].startswith("-"):
+        if args[0] == "-f":
+            compose_file = args[1]
+            args = args[2:]
+        else:
+            args = args[1:]
+    project = FakeProject(compose_file)
+    command, rest = args[0], args[1:]
+    flags = [a for a in rest if a.startswith("-")]
+    services = [a for a in rest if not a.startswith("-") and a in SERVICES]
+
+    if command == "ps":
+        state = project.load()
+        running = [s for s in (services or SERVICES) if s in state]
+        if "-q" in flags:
+            print("\n".join(container_id(s) for s in running))
+        else:
+            print(f"{'NAME':<24}{'SERVICE':<12}STATUS")
+            for service in running:
+                print(f"{'wms-' + service + '-prod':<24}{service:<12}{state[service]['status']}")
+        return 0
+    if command == "build":
+        delay()
+        return 0
+    if command in ("up", "start", "restart"):
+        if command != "start":
+            delay()
+        project.set_status(services, "running")
+        return 0
+    if command == "stop":
+        project.set_status(services, "exited")
+        return 0
+    if command == "down":
+        project.set_status(None, None)
+        return 0
+    if command == "exec":
+        start = next(i for i, a in enumerate(rest) if not a.startswith("-"))
+        return exec_in_container(project, rest[start], rest[start + 1:])
+    if command == "run":
+        return 0
+    if command == "logs":
+        options = dict(a[2:].split("=", 1) for a in rest if a.startswith("--") and "=" in a)
+        tail = options.get("tail", "20")
+        tail = 100 if tail == "all" else int(tail)
+        since, until = (parse_rfc3339(options[key]) if key in options else None for key in ("since", "until"))
+        for service in services or SERVICES:
+            for n in range(tail):
+                timestamp = time.time() - (tail - n)
+                if (since is None or timestamp >= since) and (until is None or timestamp <= until):
+                    print(fake_log_line(service, n, timestamp, "-t" in flags))
+        if "-f" in flags:
+            n = tail
+            while True:
+                time.sleep(1)
+                for service in services or SERVICES:
+                    print(fake_log_line(service, n, time.time(), "-t" in flags), flush=True)
+                n += 1
+        return 0
+    return 0
+
+
+def inspect(args):
+    ids = [a for a in args if a.startswith("fake-")]
+    format_given = "-f" in args or "--format" in args
+    states = FakeProject("docker-compose.yml").load()
+    if format_given:
+        for container in ids:
+            status = states.get(container[5:], {}).get("status", "missing")
+            print("healthy" if status == "running" else status)
+        return 0 if ids else 1
+    containers = []
+    for container in ids:
+        service = container[5:]
+        entry = states.get(service, {})
+        status = entry.get("status", "exited")
+        containers.append({
+            "Name": f"/wms-{service}-prod",
+            "RestartCount": entry.get("restart_count", 0),
+            "Config": {"Labels": {"com.docker.compose.service": service}},
+            "State": {
+                "Status": status,
+                "Health": {"Status": "healthy" if status == "running" else "unhealthy"},
+                "StartedAt": entry.get("started_at"),
+            },
+        })
+    print(json.dumps(containers))
+    return 0
+
+
+def docker(args):
+    command, rest = args[0], args[1:]
+    if command == "inspect":
+        return inspect(rest)
+    if command == "system" and rest[:1] == ["df"]:
+        for kind in ["Images", "Containers", "Local Volumes", "Build Cache"]:
+            print(json.dumps({"Type": kind, "TotalCount": "4", "Active": "4", "Size": "1.2GB", "Reclaimable": "0B (0%)"}))
+        return 0
+    if command == "load":
+        size = sum(len(block) for block in iter(lambda: sys.stdin.buffer.read(1024 * 1024), b""))
+        print(f"Loaded image ({size} bytes)")
+        return 0
+    if command in ("image", "images") and "ls" in rest:
+        return 0
+    if command == "--version":
+        print("Docker version 24.0.0, build fake")
+        return 0
+    if command == "compose":
+        return compose(rest)
+    # ps, image prune, system prune ...
+    return 0
+
+
+def ssh(args):
+    """Remote shell for rsync: drop the target and run the command here"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from transport import map_local_paths
+    command = " ".join(args[1:])
+    return subprocess.call(["bash", "-c", map_local_paths(command, os.environ["FAKE_DOCKER_ROOT"])])
+
+
+def curl(args):
+    """Pretend every local endpoint answers quickly; fill in -w status and timing"""
+    if any(a.endswith("/auth/login") for a in args):
+        sys.stdin.read()
+        print(json.dumps({"token": "fake-token"}))
+        return 0
+    if "-w" in args:
+        write_out = args[args.index("-w") + 1]
+        sys.stdout.write(write_out.replace("%{http_code}", "200")
+                         .replace("%{time_total}", f"{random.uniform(0.005, 0.05):.6f}")
+                         .replace("\\n", "\n"))
+    return 0
+
+
+def fallocate(args):
+    """Create the file without reserving any space"""
+    open(args[-1], "a").close()
+    return 0
+
+
+def noop(args):
+    """System tools (apt, systemctl, ufw, ...) must never touch the machine running the tests"""
+    return 0
+
+
+def main():
+    tool, args = sys.argv[1], sys.argv[2:]
+    handler = {"docker": docker, "docker-compose": compose, "curl": curl, "ssh": ssh, "fallocate": fallocate, "noop": noop}[tool]
+    sys.exit(handler(args))
+
+
+if __name__ == "__main__":
+    main()
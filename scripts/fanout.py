@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Run one ops action against many hosts in parallel.
+
+Hosts come from an INI inventory (see inventory.example.ini), one section
+per host. Each host gets its own run of the target script as a
+subprocess; its output is buffered and printed as one block when it
+finishes, and a result table summarises every host at the end.
+
+    python3 scripts/fanout.py --limit prod monitor status
+    python3 scripts/fanout.py --parallel 2 deploy --skip-nginx
+"""
+
+import sys
+import time
+import argparse
+import subprocess
+import configparser
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Action -> (script, whether it takes --project-dir); setup always provisions /opt/wms
+SCRIPTS = {
+    "deploy": (ROOT / "deploy.py", True),
+    "monitor": (ROOT / "scripts" / "monitor.py", True),
+    "backup": (ROOT / "scripts" / "backup.py", True),
+    "setup": (ROOT / "scripts" / "setup-vps.py", False),
+}
+
+
+def load_inventory(path):
+    """Read hosts from an INI file: [host] sections with user, project_dir and groups.
+
+    project_dir is passed to deploy, monitor and backup; setup ignores it
+    and always provisions /opt/wms.
+    """
+    parser = configparser.ConfigParser()
+    if not parser.read(path):
+        sys.exit(f"Inventory not found: {path}")
+    hosts = []
+    for name in parser.sections():
+        section = parser[name]
+        hosts.append({
+            "name": name,
+            "host": section.get("host", name),
+            "user": section.get("user", "root"),
+            "project_dir": section.get("project_dir", "/opt/wms"),
+            "groups": section.get("groups", "").split(),
+        })
+    return hosts
+
+
+def select_hosts(hosts, limit):
+    """Keep hosts whose name or one of whose groups is in the comma-separated limit"""
+    if not limit:
+        return hosts
+    wanted = set(limit.split(","))
+    return [h for h in hosts if h["name"] in wanted or wanted & set(h["groups"])]
+
+
+def run_on_host(entry, action, args, timeout):
+    script, takes_project_dir = SCRIPTS[action]
+    command = [sys.executable, str(script), *args, "--host", entry["host"], "--user", entry["user"]]
+    if takes_project_dir:
+        command += ["--project-dir", entry["project_dir"]]
+
+    started = time.monotonic()
+    try:
+        result = subprocess.run(command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                text=True, timeout=timeout)
+        returncode, output = result.returncode, result.stdout
+    except subprocess.TimeoutExpired as e:
+        output = e.stdout.decode(errors="replace") if isinstance(e.stdout, bytes) else (e.stdout or "")
+        returncode, output = None, output + f"\nTimed out after {timeout}s\n"
+    return {"name": entry["name"], "returncode": returncode, "duration": time.monotonic() - started, "output": output}
+
+
+def print_results(results):
+    print("\n=== Results ===")
+    print(f"{'Host':<24}{'Status':<10}{'Exit':>6}{'Time':>9}  Last line")
+    for result in sorted(results, key=lambda r: r["name"]):
+        status = "ok" if result["returncode"] == 0 else "FAILED"
+        exit_code = "-" if result["returncode"] is None else result["returncode"]
+        lines = [line for line in result["output"].splitlines() if line.strip()]
+        last_line = lines[-1].strip()[:60] if lines else ""
+        print(f"{result['name']:<24}{status:<10}{exit_code:>6}{result['duration']:>8.1f}s  {last_line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a WMS ops action on every inventory host in parallel')
+    parser.add_argument('--inventory', default=str(ROOT / 'inventory.ini'), help='Inventory file')
+    parser.add_argument('--limit', help='Comma-separated host names or groups to run on')
+    parser.add_argument('--parallel', type=int, default=4, help='Hosts handled at once')
+    parser.add_argument('--timeout', type=int, help='Per-host timeout in seconds')
+    parser.add_argument('action', choices=list(SCRIPTS), help='Script to run on each host')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='Arguments passed to the script')
+
+    args = parser.parse_args()
+
+    hosts = select_hosts(load_inventory(args.inventory), args.limit)
+    if not hosts:
+        sys.exit("No hosts matched")
+    print(f"Running {args.action} on {len(hosts)} host(s), {args.parallel} at a time...")
+
+    started = time.monotonic()
+    results = []
+    with ThreadPoolExecutor(max_workers=args.parallel) as executor:
+        futures = [executor.submit(run_on_host, entry, args.action, args.args, args.timeout) for entry in hosts]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"\n----- {result['name']} ({result['duration']:.1f}s) -----")
+            print(result["output"].rstrip())
+
+    print_results(results)
+    print(f"\nTotal: {time.monotonic() - started:.1f}s")
+    sys.exit(0 if all(r["returncode"] == 0 for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import json
+import hashlib
+import tarfile
+
+# Tags the compose file gives to locally built application images
+SERVICE_IMAGES = {
+    "backend": "wms-backend:latest",
+    "frontend": "wms-frontend:latest",
+}
+
+# uname -m on the VPS -> docker build --platform
+PLATFORMS = {
+    "x86_64": "linux/amd64",
+    "aarch64": "linux/arm64",
+    "arm64": "linux/arm64",
+}
+
+
+def chain_ids(diff_ids):
+    """Chain IDs identify a layer together with every layer below it"""
+    chain = []
+    for diff_id in diff_ids:
+        if chain:
+            diff_id = "sha256:" + hashlib.sha256(f"{chain[-1]} {diff_id}".encode()).hexdigest()
+        chain.append(diff_id)
+    return chain
+
+
+def parse_layer_lists(output):
+    """Collect chain IDs from one `{{json .RootFS.Layers}}` list per line"""
+    present = set()
+    for line in output.splitlines():
+        if line.strip():
+            present.update(chain_ids(json.loads(line)))
+    return present
+
+
+def write_delta_archive(source_path, fileobj, present):
+    """Copy a `docker save` archive, leaving out layers the target already has.
+
+    docker load looks each layer up by chain ID before reading its tarball,
+    so layers that exist on the target never need to be present in the
+    archive. Returns (sent, skipped) layer counts.
+    """
+    with tarfile.open(source_path) as source:
+        manifest = json.load(source.extractfile("manifest.json"))
+        needed = set()
+        skippable = set()
+        for image in manifest:
+            diff_ids = json.load(source.extractfile(image["Config"]))["rootfs"]["diff_ids"]
+            for layer_path, chain_id in zip(image["Layers"], chain_ids(diff_ids)):
+                (skippable if chain_id in present else needed).add(layer_path)
+
+        sent = len(needed)
+
+        # Identical layers may be stored once and symlinked; keep the targets of anything sent
+        for member in source.getmembers():
+            if member.name in needed and member.issym():
+                needed.add(resolve_link(member))
+        skipped = skippable - needed
+
+        with tarfile.open(fileobj=fileobj, mode="w|") as archive:
+            for member in source.getmembers():
+                if member.name in skipped:
+                    continue
+                archive.addfile(member, source.extractfile(member) if member.isfile() else None)
+    return sent, len(skipped)
+
+
+def resolve_link(member):
+    parts = member.name.split("/")[:-1] + member.linkpath.split("/")
+    resolved = []
+    for part in parts:
+        if part == "..":
+            resolved.pop()
+        elif part not in ("", "."):
+            resolved.append(part)
+    return "/".join(resolved)
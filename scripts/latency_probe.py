@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Synthetic latency probe for the backend's customer-facing hot paths.
+
+Times warranty lookups, customer portal overviews and dashboard
+statistics with curl on the VPS itself, so the numbers are server time
+without the operator's network. A whole batch of requests runs in one
+SSH round-trip. Latencies go into fixed-size rings (a rolling window per
+endpoint) and p50/p95/p99 are compared with a baseline saved in the
+host's state dir.
+
+Sample serials, customer emails and the dashboard login come from
+latency-probes.ini (see latency-probes.example.ini); the login password is
+read from WMS_PROBE_PASSWORD so it never lands in a file.
+"""
+
+import os
+import json
+import time
+import shlex
+import datetime
+import configparser
+from pathlib import Path
+from urllib.parse import quote
+
+from metrics_history import MetricRing, percentile
+
+ROOT = Path(__file__).resolve().parent.parent
+API_URL = "http://localhost:3001/api"
+
+# Samples from backend/prisma/seed.ts, used when there is no latency-probes.ini
+DEFAULT_SERIALS = ["HP4015N240115001", "DL7520240220001"]
+DEFAULT_EMAILS = ["procurement@viettel.com.vn", "it.support@techcombank.com.vn"]
+
+# A percentile is flagged when it exceeds the baseline by this factor and at least MIN_REGRESSION_MS
+REGRESSION_FACTOR = 1.5
+MIN_REGRESSION_MS = 50
+PERCENTILES = [50, 95, 99]
+# An endpoint failing more than this share of its requests fails the check, whatever its latency
+MAX_ERROR_RATE = 0.1
+
+
+def load_probe_config(path=ROOT / "latency-probes.ini"):
+    """Sample serials and emails, plus the dashboard login email if any"""
+    parser = configparser.ConfigParser()
+    parser.read(path)
+    samples = parser["samples"] if parser.has_section("samples") else {}
+    return {
+        "serials": samples.get("serials", "").split() or DEFAULT_SERIALS,
+        "emails": samples.get("emails", "").split() or DEFAULT_EMAILS,
+        "login": parser.get("auth", "email", fallback=None),
+    }
+
+
+class LatencyProbe:
+    """Rolling latency windows per endpoint, checked against a stored baseline"""
+
+    def __init__(self, config, baseline_path, window=200):
+        self.config = config
+        self.baseline_path = baseline_path
+        self.password = os.environ.get("WMS_PROBE_PASSWORD")
+        self.rings = {name: MetricRing(window) for name in self.endpoints()}
+        # 1.0 per failed request and 0.0 per success, so errors roll with the same window
+        self.outcomes = {name: MetricRing(window) for name in self.rings}
+
+    def endpoints(self):
+        """Endpoint name -> (URLs to rotate through, whether a login token is needed)"""
+        endpoints = {
+            "warranty": ([f"{API_URL}/products/serials/warranty/{quote(s)}" for s in self.config["serials"]], False),
+            "portal": ([f"{API_URL}/customer-portal/overview/{quote(e)}" for e in self.config["emails"]], False),
+        }
+        if self.config["login"] and self.password:
+            endpoints["dashboard"] = ([f"{API_URL}/dashboard/statistics"], True)
+        return endpoints
+
+    def remote_script(self, samples):
+        """Shell script printing '<name> <status> <seconds>' per request"""
+        lines = []
+        if "dashboard" in self.rings:
+            # Credentials arrive on stdin, so the password never shows up in ps
+            lines.append(f"TOKEN=$(curl -s -m 10 -H 'Content-Type: application/json' -d @- {API_URL}/auth/login"
+                         " | python3 -c 'import sys, json; print(json.load(sys.stdin).get(\"token\", \"\"))')")
+        for i in range(samples):
+            for name, (urls, needs_token) in self.endpoints().items():
+                url = urls[i % len(urls)]
+                auth = ' -H "Authorization: Bearer $TOKEN"' if needs_token else ""
+                write_out = shlex.quote(f"{name} %{{http_code}} %{{time_total}}\\n")
+                lines.append(f"curl -s -o /dev/null -m 10{auth} -w {write_out} {shlex.quote(url)}")
+        return "\n".join(lines)
+
+    def login_body(self):
+        if "dashboard" not in self.rings:
+            return None
+        return json.dumps({"email": self.config["login"], "password": self.password})
+
+    def record(self, output, timestamp=None):
+        """Add the latencies in a remote_script run to the windows"""
+        timestamp = timestamp or time.time()
+        for line in output.splitlines():
+            parts = line.split()
+            if len(parts) != 3 or parts[0] not in self.rings:
+                continue
+            name, status, seconds = parts
+            if status.startswith("2"):
+                self.rings[name].append(timestamp, float(seconds) * 1000)
+                self.outcomes[name].append(timestamp, 0.0)
+            else:
+                self.outcomes[name].append(timestamp, 1.0)
+    
+    def errors(self, name):
+        """Failed requests in the endpoint's window"""
+        return int(sum(value for _, value in self.outcomes[name].samples()))
+
+    def percentiles(self, name):
+        values = sorted(value for _, value in self.rings[name].samples())
+        if not values:
+            return None
+        return {f"p{q}": percentile(values, q) for q in PERCENTILES}
+
+    def load_baseline(self):
+        try:
+            with open(self.baseline_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_baseline(self):
+        baseline = {}
+        for name, ring in self.rings.items():
+            current = self.percentiles(name)
+            if current:
+                baseline[name] = dict(current, samples=ring.count,
+                                      recorded=datetime.datetime.now().isoformat(timespec="seconds"))
+        with open(self.baseline_path, "w") as f:
+            json.dump(baseline, f, indent=2)
+        return baseline
+
+    def regressions(self, name, current, baseline):
+        """Percentiles over their baseline by REGRESSION_FACTOR and MIN_REGRESSION_MS"""
+        base = baseline.get(name)
+        if not base:
+            return []
+        return [key for key, value in current.items()
+                if value > base[key] * REGRESSION_FACTOR and value - base[key] >= MIN_REGRESSION_MS]
+
+    def print_report(self):
+        print("\n=== API Latency ===")
+        baseline = self.load_baseline()
+        print(f"{'Endpoint':<12}{'Samples':>8}{'Errors':>8}{'p50':>9}{'p95':>9}{'p99':>9}  vs baseline")
+        flagged = False
+        for name, ring in self.rings.items():
+            current = self.percentiles(name)
+            errors = self.errors(name)
+            if not current:
+                flagged = True
+                print(f"{name:<12}{0:>8}{errors:>8}  FAILED: no successful requests")
+                continue
+            columns = "".join(f"{current[f'p{q}']:>7.0f}ms" for q in PERCENTILES)
+            regressed = self.regressions(name, current, baseline)
+            error_rate = errors / self.outcomes[name].count
+            if error_rate > MAX_ERROR_RATE:
+                flagged = True
+                comparison = f"FAILED: {error_rate:.0%} of requests failed"
+            elif regressed:
+                flagged = True
+                comparison = "REGRESSION " + ", ".join(
+                    f"{key} {baseline[name][key]:.0f}->{current[key]:.0f}ms" for key in regressed)
+            elif name in baseline:
+                comparison = f"p95 {current['p95'] - baseline[name]['p95']:+.0f}ms"
+            else:
+                comparison = "-"
+            print(f"{name:<12}{ring.count:>8}{errors:>8}{columns}  {comparison}")
+        if "dashboard" not in self.rings:
+            print("(dashboard skipped: set [auth] email in latency-probes.ini and WMS_PROBE_PASSWORD)")
+        return not flagged
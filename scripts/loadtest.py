@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""Load test for the backend API.
+
+Drives a mix of logins, ticket lists, warranty serial lookups and
+dashboard chart calls at a request rate ramped from ``--rps START:END``
+over ``--duration`` seconds. Requests are scheduled open-loop (on time,
+whether or not earlier ones have answered) up to ``--concurrency`` in
+flight, over a small asyncio HTTP/1.1 client with keep-alive connections,
+so no third-party packages are needed. The report breaks throughput,
+latency and errors down per ramp step and per endpoint, and names the
+step where latency or errors first degrade.
+
+    python3 scripts/loadtest.py --rps 5:100 --duration 120
+    python3 scripts/loadtest.py --url https://api.foresttruong.info --mix serial=1 --rps 20
+"""
+
+import os
+import ssl
+import sys
+import json
+import time
+import math
+import random
+import asyncio
+from urllib.parse import urlsplit, quote
+
+from metrics_history import percentile
+from latency_probe import load_probe_config
+
+# Endpoint -> (method, path, needs a token); {serial} is filled per request
+ENDPOINTS = {
+    "login": ("POST", "/api/auth/login", False),
+    "tickets": ("GET", "/api/tickets?page=1&limit=20", True),
+    "serial": ("GET", "/api/products/serials/warranty/{serial}", False),
+    "chart": ("GET", "/api/dashboard/charts/warranty-requests", True),
+}
+DEFAULT_MIX = "login=1,tickets=3,serial=5,chart=1"
+
+# Upper bounds of the latency histogram buckets, in ms
+HISTOGRAM_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf")]
+
+# A step is degraded when its p95 exceeds the first step's by this factor, or errors pass ERROR_RATE_LIMIT
+DEGRADED_FACTOR = 2.0
+ERROR_RATE_LIMIT = 0.01
+
+
+class HTTPError(Exception):
+    pass
+
+
+class HTTPConnection:
+    """One keep-alive HTTP/1.1 connection"""
+
+    def __init__(self, host, port, tls):
+        self.host = host
+        self.port = port
+        self.tls = ssl.create_default_context() if tls else None
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, headers=None, body=b"", timeout=30):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=self.tls), timeout)
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        try:
+            status, response_headers, response = await asyncio.wait_for(self.read_response(), timeout)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            self.close()
+            raise
+        if response_headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, response
+
+    async def read_response(self):
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if not size:
+                    break
+                body += await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+            # Trailers, up to the blank line that ends the response
+            while (await self.reader.readuntil(b"\r\n")) != b"\r\n":
+                pass
+            return status, headers, bytes(body)
+        return status, headers, await self.reader.readexactly(int(headers.get("content-length", 0)))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class LoadTest:
+    def __init__(self, url, mix, rps, duration, steps=5, concurrency=50, email="admin@wms.com", password=None, serials=None):
+        parts = urlsplit(url)
+        self.tls = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.tls else 80)
+        self.mix = mix
+        self.start_rps, self.end_rps = rps
+        self.duration = duration
+        self.steps = steps
+        self.concurrency = concurrency
+        self.credentials = json.dumps({"email": email, "password": password}).encode()
+        self.serials = serials or load_probe_config()["serials"]
+        self.token = None
+        self.idle = []
+        # (step, endpoint, status or None, ms or None)
+        self.results = []
+        self.skipped = [0] * steps
+        self.rng = random.Random(0)
+
+    def rate_at(self, elapsed):
+        """Requests per second at a point in the ramp, held flat within each step"""
+        step = min(int(elapsed / self.duration * self.steps), self.steps - 1)
+        if self.steps == 1:
+            return self.start_rps
+        return self.start_rps + (self.end_rps - self.start_rps) * step / (self.steps - 1)
+
+    async def call(self, endpoint, timeout=30):
+        method, path, needs_token = ENDPOINTS[endpoint]
+        path = path.format(serial=quote(self.rng.choice(self.serials)))
+        headers = {"Connection": "keep-alive"}
+        body = b""
+        if endpoint == "login":
+            headers["Content-Type"] = "application/json"
+            body = self.credentials
+        if needs_token and self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        reused = bool(self.idle)
+        connection = self.idle.pop() if reused else HTTPConnection(self.host, self.port, self.tls)
+        try:
+            status, response = await connection.request(method, path, headers, body, timeout)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            if not reused:
+                raise
+            # The server may have closed an idle keep-alive connection; retry once on a new one
+            connection = HTTPConnection(self.host, self.port, self.tls)
+            status, response = await connection.request(method, path, headers, body, timeout)
+        finally:
+            if connection.writer is not None:
+                self.idle.append(connection)
+        return status, response
+
+    async def login(self):
+        status, response = await self.call("login")
+        if status not in (200, 201):
+            raise HTTPError(f"login failed with HTTP {status}: {response[:200].decode(errors='replace')}")
+        self.token = json.loads(response)["token"]
+
+    async def timed_call(self, step, endpoint, slots):
+        started = time.perf_counter()
+        try:
+            status, _ = await self.call(endpoint)
+            self.results.append((step, endpoint, status, (time.perf_counter() - started) * 1000))
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            self.results.append((step, endpoint, None, None))
+        finally:
+            slots.release()
+
+    async def run(self):
+        await self.login()
+        endpoints = list(self.mix)
+        weights = [self.mix[name] for name in endpoints]
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        next_at = 0.0
+        while next_at < self.duration:
+            delay = started + next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            step = min(int(next_at / self.duration * self.steps), self.steps - 1)
+            if slots.locked():
+                # Open loop: a request that cannot start on time is counted, not queued
+                self.skipped[step] += 1
+            else:
+                await slots.acquire()
+                endpoint = self.rng.choices(endpoints, weights)[0]
+                task = asyncio.ensure_future(self.timed_call(step, endpoint, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            next_at += 1 / self.rate_at(next_at)
+        if tasks:
+            await asyncio.wait(tasks)
+        for connection in self.idle:
+            connection.close()
+
+    def print_report(self):
+        step_seconds = self.duration / self.steps
+        print(f"\n=== Load test: {self.host}:{self.port}, {self.duration}s, "
+              f"{self.start_rps:g}->{self.end_rps:g} req/s, {self.concurrency} max in flight ===")
+        print(f"{'Step':<6}{'Target':>8}{'Done':>8}{'Req/s':>8}{'Errors':>8}{'Skipped':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+        baseline_p95 = None
+        degraded_at = None
+        for step in range(self.steps):
+            rows = [r for r in self.results if r[0] == step]
+            latencies = sorted(r[3] for r in rows if r[3] is not None)
+            errors = sum(1 for r in rows if r[2] is None or r[2] >= 400)
+            error_rate = errors / len(rows) if rows else 0
+            target = self.rate_at(step * step_seconds)
+            if latencies:
+                p50, p95, p99 = (percentile(latencies, q) for q in (50, 95, 99))
+                columns = f"{p50:>7.0f}ms{p95:>7.0f}ms{p99:>7.0f}ms"
+                baseline_p95 = baseline_p95 or p95
+                if degraded_at is None and (p95 > baseline_p95 * DEGRADED_FACTOR or error_rate > ERROR_RATE_LIMIT
+                                            or self.skipped[step]):
+                    degraded_at = step
+            else:
+                columns = f"{'-':>9}{'-':>9}{'-':>9}"
+            print(f"{step + 1:<6}{target:>8.1f}{len(rows):>8}{len(rows) / step_seconds:>8.1f}"
+                  f"{error_rate:>7.1%} {self.skipped[step]:>8}{columns}")
+
+        print(f"\n{'Endpoint':<10}{'Requests':>10}{'Errors':>8}{'p50':>9}{'p95':>9}{'p99':>9}  Status codes")
+        for endpoint in self.mix:
+            rows = [r for r in self.results if r[1] == endpoint]
+            if not rows:
+                continue
+            latencies = sorted(r[3] for r in rows if r[3] is not None)
+            codes = {}
+            for r in rows:
+                codes[r[2] or "conn"] = codes.get(r[2] or "conn", 0) + 1
+            errors = sum(count for code, count in codes.items() if code == "conn" or code >= 400)
+            columns = "".join(f"{percentile(latencies, q):>7.0f}ms" for q in (50, 95, 99)) if latencies else ""
+            print(f"{endpoint:<10}{len(rows):>10}{errors / len(rows):>7.1%} {columns}  "
+                  f"{', '.join(f'{code}: {count}' for code, count in sorted(codes.items(), key=str))}")
+
+        latencies = [r[3] for r in self.results if r[3] is not None]
+        print("\nLatency histogram:")
+        lower = 0
+        for upper in HISTOGRAM_BUCKETS:
+            count = sum(1 for ms in latencies if lower <= ms < upper)
+            label = f"{lower:g}-{upper:g}ms" if upper != float("inf") else f">={lower:g}ms"
+            bar = "#" * round(40 * count / len(latencies)) if latencies else ""
+            print(f"{label:>14} {count:>7}  {bar}")
+            lower = upper
+
+        if degraded_at is None:
+            print(f"\nNo degradation up to {self.end_rps:g} req/s")
+        else:
+            print(f"\nDegraded at step {degraded_at + 1} ({self.rate_at(degraded_at * step_seconds):.1f} req/s target)")
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint {name!r} (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def parse_rps(text):
+    start, _, end = text.partition(":")
+    rates = float(start), float(end or start)
+    # The scheduler spaces requests 1/rate apart, so every step needs a positive, finite rate
+    if not all(0 < rate < math.inf for rate in rates):
+        raise ValueError(f"rates must be positive and finite: {text!r}")
+    return rates
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Load test the WMS backend API')
+    parser.add_argument('--url', default='http://localhost:3001', help='Backend base URL')
+    parser.add_argument('--rps', type=parse_rps, default=(5.0, 50.0), help='Request rate, START:END to ramp')
+    parser.add_argument('--duration', type=float, default=60, help='Test length in seconds')
+    parser.add_argument('--steps', type=int, default=5, help='Ramp steps')
+    parser.add_argument('--concurrency', type=int, default=50, help='Maximum requests in flight')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f'Endpoint weights, e.g. {DEFAULT_MIX}')
+    parser.add_argument('--email', default='admin@wms.com', help='Login used for the test (password from WMS_LOADTEST_PASSWORD)')
+
+    args = parser.parse_args()
+
+    # The seed password suits a local docker-compose stack; anything else needs the variable
+    password = os.environ.get("WMS_LOADTEST_PASSWORD", "password123")
+    test = LoadTest(args.url, args.mix, args.rps, args.duration, args.steps, args.concurrency, args.email, password)
+    try:
+        asyncio.run(test.run())
+    except (HTTPError, OSError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\nInterrupted, reporting what completed")
+    test.print_report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Local SQLite index of container logs for monitor.py index/search.
+
+Lines are stored once in ``<state dir>/logs.db`` keyed by timestamp,
+service and level, with an FTS5 table over the message text kept in sync
+by triggers. Each service has a cursor holding the newest timestamp
+indexed; ingestion hands it to docker-compose logs --since, so docker
+skips everything older and repeated runs download nothing twice.
+"""
+
+import sys
+import sqlite3
+
+from log_stream import log_pipeline, stream_lines
+from remote_log_filter import split_line, line_level
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lines (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    service TEXT NOT NULL,
+    level TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lines_service_ts ON lines (service, ts);
+CREATE INDEX IF NOT EXISTS lines_level_ts ON lines (level, ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS lines_fts USING fts5 (message, content='lines', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS lines_insert AFTER INSERT ON lines BEGIN
+    INSERT INTO lines_fts (rowid, message) VALUES (new.id, new.message);
+END;
+CREATE TRIGGER IF NOT EXISTS lines_delete AFTER DELETE ON lines BEGIN
+    INSERT INTO lines_fts (lines_fts, rowid, message) VALUES ('delete', old.id, old.message);
+END;
+CREATE TABLE IF NOT EXISTS cursors (
+    service TEXT PRIMARY KEY,
+    ts TEXT NOT NULL
+);
+"""
+
+BATCH_SIZE = 1000
+
+
+class LogIndex:
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        try:
+            self.db.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            print(f"Error: this Python's SQLite cannot build the log index ({e})")
+            sys.exit(1)
+
+    def cursor(self, service):
+        row = self.db.execute("SELECT ts FROM cursors WHERE service = ?", (service,)).fetchone()
+        return row[0] if row else None
+
+    def ingest(self, transport, compose_command, service):
+        """Index the service's lines newer than its cursor; returns the number added"""
+        after = self.cursor(service)
+        # Docker starts at the cursor's whole second; lines in it that are already indexed are dropped below
+        pipeline = log_pipeline(compose_command, [service], since=after[:19] if after else None)
+        added = 0
+        batch = []
+        newest = after
+        with self.db:
+            for line in stream_lines(transport, pipeline):
+                _, timestamp, message = split_line(line)
+                if not timestamp or (after and timestamp <= after):
+                    continue
+                batch.append((timestamp, service, line_level(message), message))
+                newest = max(newest or timestamp, timestamp)
+                if len(batch) >= BATCH_SIZE:
+                    added += self.insert(batch)
+                    batch = []
+            added += self.insert(batch)
+            if newest:
+                self.db.execute("INSERT OR REPLACE INTO cursors (service, ts) VALUES (?, ?)", (service, newest))
+        return added
+
+    def insert(self, batch):
+        self.db.executemany("INSERT INTO lines (ts, service, level, message) VALUES (?, ?, ?, ?)", batch)
+        return len(batch)
+
+    def prune(self, before):
+        """Drop lines older than the UTC timestamp ``before``"""
+        with self.db:
+            return self.db.execute("DELETE FROM lines WHERE ts < ?", (before,)).rowcount
+
+    def search(self, match=None, services=None, levels=None, since=None, until=None, limit=100):
+        """Newest matching lines first, as (ts, service, level, message) rows"""
+        clauses, params = [], []
+        if match:
+            clauses.append("id IN (SELECT rowid FROM lines_fts WHERE lines_fts MATCH ?)")
+            params.append(match)
+        if services:
+            clauses.append(f"service IN ({', '.join('?' * len(services))})")
+            params += services
+        if levels:
+            clauses.append(f"level IN ({', '.join('?' * len(levels))})")
+            params += levels
+        if since:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until:
+            clauses.append("ts <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = f"SELECT ts, service, level, message FROM lines {where} ORDER BY ts DESC LIMIT ?"
+        return self.db.execute(query, params + [limit]).fetchall()
+
+    def stats(self):
+        return self.db.execute("SELECT service, COUNT(*), MIN(ts), MAX(ts) FROM lines GROUP BY service").fetchall()
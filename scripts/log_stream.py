@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Streaming docker-compose logs for monitor.py.
+
+Lines are read from the remote pipeline as they arrive and yielded one at
+a time, never collected. Time windows go to docker-compose logs as
+--since/--until, so docker skips lines outside them; level and regex
+filtering happens on the VPS through remote_log_filter.py. Tail mode
+opens one stream per service and merges them by timestamp, holding a
+single pending line per service; follow mode reads one multiplexed
+stream in arrival order.
+"""
+
+import re
+import heapq
+import shlex
+import subprocess
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+from remote_log_filter import split_line
+
+FILTER_SOURCE = (Path(__file__).resolve().parent / "remote_log_filter.py").read_text()
+
+DURATION = re.compile(r"^(\d+)([smhd])$")
+DURATION_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_time(value, now=None):
+    """UTC 'YYYY-MM-DDTHH:MM:SS' for a duration ago ('30m', '6h', '2d') or an ISO time"""
+    match = DURATION.match(value)
+    if match:
+        now = now or datetime.now(timezone.utc)
+        moment = now - timedelta(**{DURATION_UNITS[match.group(2)]: int(match.group(1))})
+    else:
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is None:
+            moment = moment.astimezone()
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def log_pipeline(compose_command, services, tail="all", follow=False, level="info", grep=None, since=None, until=None):
+    """Remote command that prints filtered, timestamped compose logs"""
+    logs_args = ["logs", "--no-color", "-t", f"--tail={tail}"] + (["-f"] if follow else [])
+    # parse_time gives UTC without a zone; docker would read that in the VPS's local time
+    if since:
+        logs_args.append(f"--since={since}Z")
+    if until:
+        logs_args.append(f"--until={until}Z")
+    logs_args += list(services)
+    filter_args = ["--level", level]
+    if grep:
+        filter_args += ["--grep", grep]
+    return (f"{compose_command(' '.join(logs_args))} 2>&1 | "
+            f"python3 -u -c {shlex.quote(FILTER_SOURCE)} {' '.join(shlex.quote(a) for a in filter_args)}")
+
+
+def stream_lines(transport, command):
+    """Yield lines of a remote command's output as they arrive"""
+    process = transport.open(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        for raw in process.stdout:
+            yield raw.decode(errors="replace").rstrip("\n")
+    finally:
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+
+
+def merge_by_time(streams):
+    """Interleave per-service streams, each already in time order"""
+    return heapq.merge(*streams, key=lambda line: split_line(line)[1])
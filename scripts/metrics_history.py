@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Fixed-size metric history for monitor.py watch mode.
+
+Each metric keeps its samples in a pair of ``array('d')`` ring buffers
+(timestamps and values) of a fixed capacity, so a watch session can run
+for days without growing. The history drives the trend table (sparkline,
+min/avg/p95) and rate-of-change alerts, and can be saved to the host's
+state dir so a restarted watch keeps its trends.
+"""
+
+import os
+import json
+import math
+from array import array
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+# Snapshot field -> (label, unit)
+METRICS = {
+    "cpu": ("CPU", "%"),
+    "memory": ("Memory", "%"),
+    "disk": ("Disk", "%"),
+    "load": ("Load 1m", ""),
+}
+
+# Metric -> (window in seconds, rise per hour that raises an alert)
+RATE_ALERTS = {
+    "cpu": (600, 120.0),
+    "memory": (1800, 20.0),
+    "disk": (3600, 2.0),
+}
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of already sorted values"""
+    return values[max(math.ceil(q / 100 * len(values)) - 1, 0)]
+
+
+def snapshot_metrics(snapshot):
+    """Pick the tracked values out of a remote_collector snapshot"""
+    return {
+        "cpu": snapshot["cpu_percent"],
+        "memory": snapshot["memory"]["percent"],
+        "disk": snapshot["disk"]["percent"],
+        "load": snapshot["load_average"][0],
+    }
+
+
+class MetricRing:
+    """The last ``capacity`` (timestamp, value) samples of one metric"""
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError(f"ring capacity must be at least 1, got {capacity}")
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp, value):
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def samples(self, since=None):
+        """(timestamp, value) pairs, oldest first"""
+        start = (self.head - self.count) % self.capacity
+        pairs = []
+        for i in range(self.count):
+            index = (start + i) % self.capacity
+            if since is None or self.times[index] >= since:
+                pairs.append((self.times[index], self.values[index]))
+        return pairs
+
+    def latest(self):
+        return self.values[(self.head - 1) % self.capacity] if self.count else None
+
+    def stats(self):
+        """min, avg and nearest-rank p95 over the whole ring"""
+        values = sorted(value for _, value in self.samples())
+        if not values:
+            return None
+        return {"min": values[0], "avg": sum(values) / len(values), "p95": percentile(values, 95), "max": values[-1]}
+
+    def rate_per_hour(self, window):
+        """Least-squares slope over the last ``window`` seconds, in units per hour.
+
+        None until the samples cover at least half the window, so a single
+        spike right after start does not count as a trend.
+        """
+        if not self.count:
+            return None
+        pairs = self.samples(since=self.times[(self.head - 1) % self.capacity] - window)
+        if len(pairs) < 3 or pairs[-1][0] - pairs[0][0] < window / 2:
+            return None
+        mean_t = sum(t for t, _ in pairs) / len(pairs)
+        mean_v = sum(v for _, v in pairs) / len(pairs)
+        spread = sum((t - mean_t) ** 2 for t, _ in pairs)
+        if not spread:
+            return None
+        slope = sum((t - mean_t) * (v - mean_v) for t, v in pairs) / spread
+        return slope * 3600
+
+    def sparkline(self, width=40):
+        """Bar chart of the ring, averaging samples into ``width`` buckets"""
+        values = [value for _, value in self.samples()]
+        if not values:
+            return ""
+        buckets = min(width, len(values))
+        averaged = []
+        for b in range(buckets):
+            chunk = values[b * len(values) // buckets:(b + 1) * len(values) // buckets]
+            averaged.append(sum(chunk) / len(chunk))
+        low, high = min(averaged), max(averaged)
+        span = (high - low) or 1
+        return "".join(SPARK_CHARS[int((v - low) / span * (len(SPARK_CHARS) - 1))] for v in averaged)
+
+    def to_dict(self):
+        pairs = self.samples()
+        return {"times": [t for t, _ in pairs], "values": [v for _, v in pairs]}
+
+
+class MetricHistory:
+    """Ring buffers for every tracked metric, optionally backed by a JSON file"""
+
+    def __init__(self, capacity=720, path=None):
+        self.capacity = capacity
+        self.path = path
+        self.rings = {name: MetricRing(capacity) for name in METRICS}
+        if path:
+            self.load()
+
+    def record(self, timestamp, snapshot):
+        for name, value in snapshot_metrics(snapshot).items():
+            self.rings[name].append(timestamp, float(value))
+
+    def alerts(self):
+        """Messages for metrics rising faster than their RATE_ALERTS limit"""
+        messages = []
+        for name, (window, limit) in RATE_ALERTS.items():
+            rate = self.rings[name].rate_per_hour(window)
+            if rate is not None and rate > limit:
+                label, unit = METRICS[name]
+                messages.append(f"{label} rising {rate:+.1f}{unit}/h over the last {window // 60} min "
+                                f"(limit {limit:.1f}{unit}/h, now {self.rings[name].latest():.1f}{unit})")
+        return messages
+
+    def print_trends(self, width=40):
+        print("\n=== Trends ===")
+        ring = self.rings["cpu"]
+        if ring.count < 2:
+            print("Collecting samples...")
+            return
+        samples = ring.samples()
+        span = (samples[-1][0] - samples[0][0]) / 60
+        print(f"{ring.count} samples over {span:.0f} min")
+        print(f"{'Metric':<10}{'Now':>8}{'Min':>8}{'Avg':>8}{'P95':>8}  History")
+        for name, (label, unit) in METRICS.items():
+            ring = self.rings[name]
+            stats = ring.stats()
+            columns = "".join(f"{f'{value:.1f}{unit}':>8}" for value in
+                              [ring.latest(), stats["min"], stats["avg"], stats["p95"]])
+            print(f"{label:<10}{columns}  {ring.sparkline(width)}")
+        for message in self.alerts():
+            print(f"⚠ {message}")
+
+    def load(self):
+        """Refill the rings from the saved file, keeping the newest samples"""
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, data in saved.get("metrics", {}).items():
+            if name in self.rings:
+                for timestamp, value in list(zip(data["times"], data["values"]))[-self.capacity:]:
+                    self.rings[name].append(timestamp, value)
+
+    def save(self):
+        """Write every ring to the file, atomically"""
+        if not self.path:
+            return
+        partial = f"{self.path}.partial"
+        with open(partial, "w") as f:
+            json.dump({"metrics": {name: ring.to_dict() for name, ring in self.rings.items()}}, f)
+        os.replace(partial, self.path)
@@ -6,106 +6,331 @@ import subprocess
 import json
 import time
 from datetime import datetime
+from pathlib import Path
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from transport import transport_for, local_state_dir
+from metrics_history import MetricHistory
+from exporter import MetricsExporter
+from log_stream import parse_time, log_pipeline, stream_lines, merge_by_time
+from log_index import LogIndex
+from remote_log_filter import LEVEL_RANK
+from cert_check import CertificateCache, WARN_DAYS
+from latency_probe import LatencyProbe, load_probe_config
+
+# Probes use --probe-timeout; a restart waits for the container's stop grace period and start
+RESTART_TIMEOUT = 300
+
+# Log lines per service shown when neither --lines nor --since is given
+DEFAULT_LOG_TAIL = 50
+
+COLLECTOR_SOURCE = (Path(__file__).resolve().parent / "remote_collector.py").read_text()
+
+def format_bytes(size):
+    """Format a byte count with a binary unit suffix"""
+    for unit in ["B", "Ki", "Mi", "Gi"]:
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}Ti"
+
+class ProbeFailure:
+    """Placeholder result for a probe that raised or ran out of time"""
+    def __init__(self, reason):
+        self.reason = reason
+    
+    def __str__(self):
+        return self.reason
+
+class ProbeEngine:
+    """Fan probes out over a bounded thread pool and collect their results"""
+    def __init__(self, max_workers=8, timeout=20):
+        # sshd allows 10 sessions per multiplexed connection by default
+        self.max_workers = max_workers
+        self.timeout = timeout
+    
+    def run(self, probes):
+        """Run {name: callable} probes concurrently, return {name: result}"""
+        results = {}
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = {name: pool.submit(probe) for name, probe in probes.items()}
+        # Queued probes start late, so allow one timeout per wave of workers
+        waves = -(-len(futures) // self.max_workers)
+        deadline = time.monotonic() + self.timeout * max(waves, 1)
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                results[name] = ProbeFailure(f"timed out after {self.timeout}s")
+            except subprocess.TimeoutExpired:
+                results[name] = ProbeFailure(f"timed out after {self.timeout}s")
+            except Exception as e:
+                results[name] = ProbeFailure(f"failed: {e}")
+        pool.shutdown(wait=False, cancel_futures=True)
+        return results
 
 class WMSMonitor:
-    def __init__(self, host="forest-vps", user="root", project_dir="/opt/wms"):
+    services = ['postgres', 'redis', 'backend', 'frontend']
+    domains = ['wms.foresttruong.info', 'api.foresttruong.info']
+    
+    def __init__(self, host="forest-vps", user="root", project_dir="/opt/wms", max_probes=8, probe_timeout=20, cert_ttl=3600):
         self.host = host
         self.user = user
         self.project_dir = project_dir
+        self.transport = transport_for(host, user)
+        self.probe_timeout = probe_timeout
+        self.probe_engine = ProbeEngine(max_probes, probe_timeout)
+        self.certificates = CertificateCache(cert_ttl, timeout=probe_timeout)
+        self.latency_probe = LatencyProbe(load_probe_config(), local_state_dir(host) / "latency-baseline.json")
         
-    def run_remote_command(self, command, check=False):
+    def run_remote_command(self, command, check=False, timeout=None):
         """Run command on remote server via SSH"""
-        ssh_command = f"ssh {self.user}@{self.host} '{command}'"
-        result = subprocess.run(ssh_command, shell=True, capture_output=True, text=True)
-        return result
+        return self.transport.run(command, timeout=timeout)
     
-    def check_services_status(self):
-        """Check Docker services status"""
+    def probe_command(self, command):
+        """Run a probe's remote command, bounded by the probe timeout"""
+        return self.run_remote_command(command, timeout=self.probe_timeout)
+    
+    def compose_command(self, args):
+        """Build a docker-compose command for the production stack"""
+        # No leading cd, so the command can sit anywhere in a pipeline
+        return f"docker-compose -f {self.project_dir}/docker-compose.production.yml {args}"
+    
+    def collect_snapshot(self):
+        """Collect services and system metrics in one remote round-trip"""
+        result = self.transport.run(f"python3 - {self.project_dir} docker-compose.production.yml",
+                                    input=COLLECTOR_SOURCE, timeout=self.probe_timeout)
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else f"collector exited with {result.returncode}")
+        return json.loads(result.stdout)
+    
+    def snapshot_probes(self):
+        """Probe for the batched services and system resources snapshot"""
+        return {"snapshot": self.collect_snapshot}
+    
+    def report_services_status(self, results):
+        """Print Docker services status from probe results"""
         print("=== Docker Services Status ===")
-        result = self.run_remote_command(f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml ps")
-        print(result.stdout)
+        snapshot = results["snapshot"]
+        if isinstance(snapshot, ProbeFailure):
+            print(f"⚠ Unable to collect service status ({snapshot})")
+            return
         
-        # Check individual service health
-        services = ['postgres', 'redis', 'backend', 'frontend']
-        for service in services:
-            health_result = self.run_remote_command(f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml exec -T {service} echo 'OK' 2>/dev/null")
-            status = "✅ Running" if health_result.returncode == 0 else "❌ Not Running"
+        states = snapshot["services"]
+        print(f"{'Service':<12}{'Container':<22}{'State':<10}{'Health':<12}Restarts")
+        for service, state in sorted(states.items()):
+            print(f"{service:<12}{state['container']:<22}{state['status']:<10}{state['health'] or '-':<12}{state['restart_count']}")
+        print()
+        
+        for service in self.services:
+            state = states.get(service)
+            if state is None or state["status"] != "running":
+                status = "❌ Not Running"
+            elif state["health"] in (None, "healthy"):
+                status = "✅ Running"
+            else:
+                status = f"⚠ Running ({state['health']})"
             print(f"{service}: {status}")
     
-    def check_system_resources(self):
-        """Check system resources"""
+    def check_services_status(self):
+        """Check Docker services status"""
+        self.report_services_status(self.probe_engine.run(self.snapshot_probes()))
+    
+    def report_system_resources(self, results):
+        """Print system resources from probe results"""
         print("\n=== System Resources ===")
+        snapshot = results["snapshot"]
+        if isinstance(snapshot, ProbeFailure):
+            print(f"⚠ Unable to collect system resources ({snapshot})")
+            return
         
-        # CPU usage
-        cpu_result = self.run_remote_command("top -bn1 | grep 'Cpu(s)' | awk '{print $2}' | cut -d'%' -f1")
-        print(f"CPU Usage: {cpu_result.stdout.strip()}%")
-        
-        # Memory usage
-        mem_result = self.run_remote_command("free -h | grep Mem | awk '{print $3"/"$2}'")
-        print(f"Memory Usage: {mem_result.stdout.strip()}")
-        
-        # Disk usage
-        disk_result = self.run_remote_command("df -h / | tail -1 | awk '{print $5}'")
-        print(f"Disk Usage: {disk_result.stdout.strip()}")
-        
-        # Docker disk usage
-        docker_disk = self.run_remote_command("docker system df")
+        memory = snapshot["memory"]
+        disk = snapshot["disk"]
+        print(f"CPU Usage: {snapshot['cpu_percent']}%")
+        print(f"Load Average: {' '.join(str(load) for load in snapshot['load_average'])}")
+        print(f"Memory Usage: {format_bytes(memory['used'])}/{format_bytes(memory['total'])} ({memory['percent']}%)")
+        print(f"Disk Usage: {disk['percent']}%")
         print(f"\nDocker Disk Usage:")
-        print(docker_disk.stdout)
+        print(f"{'TYPE':<16}{'TOTAL':<8}{'ACTIVE':<8}{'SIZE':<12}RECLAIMABLE")
+        for row in snapshot["docker_disk"]:
+            print(f"{row['Type']:<16}{row['TotalCount']:<8}{row['Active']:<8}{row['Size']:<12}{row['Reclaimable']}")
     
-    def check_application_health(self):
-        """Check application endpoints"""
+    def check_system_resources(self):
+        """Check system resources"""
+        self.report_system_resources(self.probe_engine.run(self.snapshot_probes()))
+    
+    def probe_output(self, command):
+        """Return the stripped stdout of a remote command"""
+        return self.probe_command(command).stdout.strip()
+    
+    def health_probes(self):
+        """Probes for application endpoints"""
+        return {
+            "health.backend": partial(self.probe_output, "curl -s -o /dev/null -w '%{http_code}' http://localhost:3001/api/health"),
+            "health.frontend": partial(self.probe_output, "curl -s -o /dev/null -w '%{http_code}' http://localhost:3000"),
+            "health.database": lambda: self.probe_command(self.compose_command("exec -T postgres pg_isready -U postgres")).returncode == 0,
+            "health.redis": lambda: "PONG" in self.probe_command(self.compose_command("exec -T redis redis-cli ping")).stdout,
+        }
+    
+    def report_application_health(self, results):
+        """Print application health from probe results"""
         print("\n=== Application Health ===")
         
-        # Check backend health
-        backend_health = self.run_remote_command("curl -s -o /dev/null -w '%{http_code}' http://localhost:3001/api/health")
-        backend_status = "✅ Healthy" if backend_health.stdout.strip() == "200" else f"❌ Unhealthy ({backend_health.stdout.strip()})"
-        print(f"Backend API: {backend_status}")
-        
-        # Check frontend
-        frontend_health = self.run_remote_command("curl -s -o /dev/null -w '%{http_code}' http://localhost:3000")
-        frontend_status = "✅ Healthy" if frontend_health.stdout.strip() == "200" else f"❌ Unhealthy ({frontend_health.stdout.strip()})"
-        print(f"Frontend: {frontend_status}")
-        
-        # Check database connection
-        db_health = self.run_remote_command(f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml exec -T postgres pg_isready -U postgres")
-        db_status = "✅ Connected" if db_health.returncode == 0 else "❌ Connection Failed"
-        print(f"Database: {db_status}")
-        
-        # Check Redis
-        redis_health = self.run_remote_command(f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml exec -T redis redis-cli ping")
-        redis_status = "✅ Connected" if "PONG" in redis_health.stdout else "❌ Connection Failed"
-        print(f"Redis: {redis_status}")
-    
-    def check_logs(self, service=None, lines=50):
-        """Check application logs"""
-        print(f"\n=== Application Logs (last {lines} lines) ===")
+        for name, label in [("health.backend", "Backend API"), ("health.frontend", "Frontend")]:
+            code = results[name]
+            status = "✅ Healthy" if code == "200" else f"❌ Unhealthy ({code})"
+            print(f"{label}: {status}")
         
-        if service:
-            log_result = self.run_remote_command(f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml logs --tail={lines} {service}")
-        else:
-            log_result = self.run_remote_command(f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml logs --tail={lines}")
+        for name, label in [("health.database", "Database"), ("health.redis", "Redis")]:
+            connected = results[name]
+            if isinstance(connected, ProbeFailure):
+                status = f"❌ Connection Failed ({connected})"
+            else:
+                status = "✅ Connected" if connected else "❌ Connection Failed"
+            print(f"{label}: {status}")
+    
+    def check_application_health(self):
+        """Check application endpoints"""
+        self.report_application_health(self.probe_engine.run(self.health_probes()))
+    
+    def log_lines(self, services, lines=None, follow=False, level="info", grep=None, since=None, until=None):
+        """Yield filtered log lines; follow keeps yielding as new lines arrive"""
+        since = parse_time(since) if since else None
+        until = parse_time(until) if until else None
+        # Docker applies the time window, so a window returns all its lines unless a tail is given
+        tail = lines if lines is not None else ("all" if since else DEFAULT_LOG_TAIL)
+        pipeline = partial(log_pipeline, self.compose_command, tail=tail, follow=follow,
+                           level=level, grep=grep, since=since, until=until)
+        if follow:
+            return stream_lines(self.transport, pipeline(services))
+        return merge_by_time(stream_lines(self.transport, pipeline([service])) for service in services)
+    
+    def measure_latency(self, samples=20, timeout=None):
+        """Time the hot API paths on the VPS, in one round-trip, into the rolling window"""
+        probe = self.latency_probe
+        result = self.transport.run(probe.remote_script(samples), input=probe.login_body(), timeout=timeout)
+        if not result.stdout:
+            lines = result.stderr.strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else f"probe script exited with {result.returncode}")
+        probe.record(result.stdout)
+    
+    def run_latency_probe(self, samples):
+        """Measure one batch through the probe machinery, so a failure comes back as a ProbeFailure"""
+        # A batch is a whole script of requests, so it gets a longer limit than a single probe
+        timeout = self.probe_timeout + samples * 10
+        return ProbeEngine(1, timeout).run({"latency": partial(self.measure_latency, samples, timeout)})
+    
+    def report_latency(self, results):
+        """Print the latency report, or why the batch failed; True if within baseline"""
+        failure = results["latency"]
+        if isinstance(failure, ProbeFailure):
+            print("\n=== API Latency ===")
+            print(f"❌ Latency probe {failure}")
+            return False
+        return self.latency_probe.print_report()
+    
+    def check_latency(self, samples=20, save_baseline=False):
+        """Report API latency percentiles against the stored baseline"""
+        results = self.run_latency_probe(samples)
+        within_baseline = self.report_latency(results)
+        if save_baseline and not isinstance(results["latency"], ProbeFailure):
+            self.latency_probe.save_baseline()
+            print(f"Baseline saved to {self.latency_probe.baseline_path}")
+        return within_baseline
+    
+    def check_logs(self, service=None, lines=None, follow=False, level="info", grep=None, since=None, until=None):
+        """Print application logs as they stream in"""
+        services = [service] if service else self.services
+        if not follow:
+            scope = []
+            if lines is not None or not since:
+                scope.append(f"last {lines if lines is not None else DEFAULT_LOG_TAIL} lines")
+            if since:
+                scope.append(f"since {since}")
+            if until:
+                scope.append(f"until {until}")
+            if level != "info":
+                scope.append(f"{level} and above")
+            if grep:
+                scope.append(f"matching {grep!r}")
+            print(f"\n=== Application Logs ({', '.join(scope)}) ===")
         
-        print(log_result.stdout)
+        try:
+            for line in self.log_lines(services, lines, follow, level, grep, since, until):
+                print(line, flush=True)
+        except KeyboardInterrupt:
+            print("\nStopped following logs.")
     
-    def check_ssl_certificates(self):
-        """Check SSL certificate status"""
+    def log_index(self):
+        return LogIndex(local_state_dir(self.host) / "logs.db")
+    
+    def index_logs(self, service=None, keep_days=None):
+        """Pull log lines added since the last run into the local index"""
+        print("=== Indexing Logs ===")
+        index = self.log_index()
+        for name in [service] if service else self.services:
+            started = time.monotonic()
+            added = index.ingest(self.transport, self.compose_command, name)
+            print(f"{name}: {added} new lines in {time.monotonic() - started:.1f}s")
+        if keep_days:
+            cutoff = parse_time(f"{keep_days}d")
+            print(f"Pruned {index.prune(cutoff)} lines older than {keep_days} days")
+        for name, count, first, last in index.stats():
+            print(f"{name:<12}{count:>10} lines  {first[:19]} .. {last[:19]}")
+    
+    def search_logs(self, match=None, service=None, level="info", since=None, until=None, limit=100):
+        """Query the local log index, newest lines first"""
+        levels = [name for name, rank in LEVEL_RANK.items() if rank >= LEVEL_RANK[level]]
+        started = time.perf_counter()
+        rows = self.log_index().search(
+            match=match, services=[service] if service else None,
+            levels=levels if level != "info" else None,
+            since=parse_time(since) if since else None,
+            until=parse_time(until) if until else None, limit=limit
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+        for ts, name, line_level, message in reversed(rows):
+            print(f"{ts[:23]} {name:<10}{line_level:<7}{message}")
+        print(f"\n{len(rows)} lines in {elapsed:.1f} ms")
+    
+    def ssl_probes(self):
+        """Probes for SSL certificate status"""
+        return {f"ssl.{domain}": partial(self.probe_certificate, domain) for domain in self.domains}
+    
+    def probe_certificate(self, domain):
+        """Return the domain's certificate details, cached; raises if no certificate could be read"""
+        return self.certificates.get(domain)
+    
+    def report_ssl_certificates(self, results):
+        """Print SSL certificate status from probe results"""
         print("\n=== SSL Certificates ===")
         
-        domains = ['wms.foresttruong.info', 'api.foresttruong.info']
-        
-        for domain in domains:
-            cert_result = self.run_remote_command(f"echo | openssl s_client -servername {domain} -connect {domain}:443 2>/dev/null | openssl x509 -noout -dates 2>/dev/null")
-            if cert_result.returncode == 0:
-                print(f"{domain}: ✅ Valid")
-                print(cert_result.stdout)
+        for domain in self.domains:
+            cert = results[f"ssl.{domain}"]
+            if isinstance(cert, ProbeFailure):
+                print(f"{domain}: ❌ Unreachable ({cert})")
+                continue
+            if cert["error"]:
+                status = f"❌ Invalid ({cert['error']})"
             else:
-                print(f"{domain}: ❌ Invalid or Not Found")
+                status = "⚠ Expires soon" if cert["days_left"] < WARN_DAYS else "✅ Valid"
+            print(f"{domain}: {status}, {cert['days_left']:.0f} days left "
+                  f"(expires {cert['not_after']:%Y-%m-%d %H:%M} UTC, issuer {cert['issuer']})")
+    
+    def check_ssl_certificates(self):
+        """Check SSL certificate status"""
+        self.report_ssl_certificates(self.probe_engine.run(self.ssl_probes()))
     
     def restart_service(self, service):
         """Restart a specific service"""
         print(f"\n=== Restarting {service} ===")
-        result = self.run_remote_command(f"cd {self.project_dir} && docker-compose -f docker-compose.production.yml restart {service}")
+        try:
+            result = self.run_remote_command(self.compose_command(f"restart {service}"), timeout=RESTART_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            print(f"❌ {service} did not restart within {RESTART_TIMEOUT}s; check it with: status")
+            sys.exit(1)
         if result.returncode == 0:
             print(f"✅ {service} restarted successfully")
         else:
@@ -114,23 +339,38 @@ class WMSMonitor:
     
     def full_status_check(self):
         """Run complete status check"""
+        # Fan every probe out at once; the report takes as long as the slowest one
+        probes = {}
+        probes.update(self.snapshot_probes())
+        probes.update(self.health_probes())
+        probes.update(self.ssl_probes())
+        results = self.probe_engine.run(probes)
+        
         print(f"WMS Monitoring Report - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("=" * 60)
         
-        self.check_services_status()
-        self.check_system_resources()
-        self.check_application_health()
-        self.check_ssl_certificates()
+        self.report_services_status(results)
+        self.report_system_resources(results)
+        self.report_application_health(results)
+        self.report_ssl_certificates(results)
+        return results
     
-    def watch_mode(self, interval=30):
-        """Continuous monitoring mode"""
+    def watch_mode(self, interval=30, history_size=720, persist=False):
+        """Continuous monitoring mode, with trends over the last history_size samples"""
         print(f"Starting continuous monitoring (interval: {interval}s)")
         print("Press Ctrl+C to stop")
         
+        history_path = local_state_dir(self.host) / "watch-metrics.json" if persist else None
+        history = MetricHistory(history_size, history_path)
         try:
             while True:
                 os.system('clear')
-                self.full_status_check()
+                results = self.full_status_check()
+                if not isinstance(results["snapshot"], ProbeFailure):
+                    history.record(time.time(), results["snapshot"])
+                    history.save()
+                history.print_trends()
+                self.report_latency(self.run_latency_probe(samples=3))
                 time.sleep(interval)
         except KeyboardInterrupt:
             print("\nMonitoring stopped.")
@@ -140,29 +380,59 @@ def main():
     
     parser = argparse.ArgumentParser(description='WMS Application Monitor')
     parser.add_argument('action', nargs='?', default='status', 
-                       choices=['status', 'logs', 'restart', 'watch'], 
+                       choices=['status', 'logs', 'restart', 'watch', 'serve', 'index', 'search', 'latency'], 
                        help='Action to perform')
     parser.add_argument('--service', help='Specific service name')
-    parser.add_argument('--lines', type=int, default=50, help='Number of log lines to show')
+    parser.add_argument('--lines', type=int, help='Log lines per service to read (default 50, or all with --since)')
+    parser.add_argument('--follow', '-f', action='store_true', help='Keep streaming new log lines')
+    parser.add_argument('--level', default='info', choices=['info', 'warn', 'error'], help='Minimum log level to show')
+    parser.add_argument('--grep', help='Only log lines whose message matches this regex')
+    parser.add_argument('--since', help='Log lines after this time: 30m, 6h, 2d or an ISO timestamp')
+    parser.add_argument('--until', help='Log lines before this time: 30m, 6h, 2d or an ISO timestamp')
+    parser.add_argument('--match', help='Full-text query for search, e.g. "timeout OR refused"')
+    parser.add_argument('--limit', type=int, default=100, help='Maximum lines returned by search')
+    parser.add_argument('--keep-days', type=int, help='Drop indexed lines older than this many days')
+    parser.add_argument('--samples', type=int, default=20, help='Requests per endpoint for the latency action')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this latency run as the baseline')
     parser.add_argument('--interval', type=int, default=30, help='Watch mode interval in seconds')
+    parser.add_argument('--history-size', type=int, default=720, help='Samples kept per metric in watch mode')
+    parser.add_argument('--persist', action='store_true', help='Keep watch mode trends across restarts')
+    parser.add_argument('--bind', default='127.0.0.1', help='Address for the serve action to listen on')
+    parser.add_argument('--port', type=int, default=9105, help='Port for the serve action')
     parser.add_argument('--host', default='forest-vps', help='VPS hostname')
     parser.add_argument('--user', default='root', help='SSH user')
+    parser.add_argument('--project-dir', default='/opt/wms', help='Project directory on VPS')
+    parser.add_argument('--max-probes', type=int, default=8, help='Maximum probes running at once')
+    parser.add_argument('--probe-timeout', type=int, default=20, help='Per-probe timeout in seconds')
+    parser.add_argument('--cert-ttl', type=int, default=3600, help='Seconds a certificate check is cached')
     
     args = parser.parse_args()
+    if args.history_size < 1:
+        parser.error("--history-size must be at least 1")
     
-    monitor = WMSMonitor(args.host, args.user)
+    monitor = WMSMonitor(args.host, args.user, args.project_dir, max_probes=args.max_probes,
+                         probe_timeout=args.probe_timeout, cert_ttl=args.cert_ttl)
     
     if args.action == 'status':
         monitor.full_status_check()
     elif args.action == 'logs':
-        monitor.check_logs(args.service, args.lines)
+        monitor.check_logs(args.service, args.lines, args.follow, args.level, args.grep, args.since, args.until)
     elif args.action == 'restart':
         if not args.service:
             print("Error: --service is required for restart action")
             sys.exit(1)
         monitor.restart_service(args.service)
     elif args.action == 'watch':
-        monitor.watch_mode(args.interval)
+        monitor.watch_mode(args.interval, args.history_size, args.persist)
+    elif args.action == 'index':
+        monitor.index_logs(args.service, args.keep_days)
+    elif args.action == 'search':
+        monitor.search_logs(args.match, args.service, args.level, args.since, args.until, args.limit)
+    elif args.action == 'latency':
+        if not monitor.check_latency(args.samples, args.save_baseline):
+            sys.exit(1)
+    elif args.action == 'serve':
+        MetricsExporter(monitor, args.interval).serve(args.bind, args.port)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
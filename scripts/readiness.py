@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+
+READY = "ready"
+WAITING = "waiting"
+FAILED = "failed"
+
+
+class ServiceFailed(Exception):
+    """A readiness check failed or ran out of time"""
+
+    def __init__(self, name, detail):
+        super().__init__(f"{name}: {detail}")
+        self.name = name
+        self.detail = detail
+
+
+def wait_for_ready(checks, timeout=300, initial_delay=0.5, max_delay=5.0):
+    """Poll every check concurrently until all report READY.
+
+    Each check is a callable returning (state, detail). A check is retried
+    with exponential backoff until it is ready; the first FAILED state or
+    the overall deadline raises ServiceFailed and stops the other pollers.
+    Returns {name: seconds until ready}.
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    stop = threading.Event()
+
+    def poll(name, check):
+        delay = initial_delay
+        while True:
+            state, detail = check()
+            if state == READY:
+                return time.monotonic() - started
+            if state == FAILED:
+                raise ServiceFailed(name, detail)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ServiceFailed(name, f"not ready after {timeout}s ({detail})")
+            if stop.wait(min(delay, remaining)):
+                return None
+            delay = min(delay * 2, max_delay)
+
+    with ThreadPoolExecutor(max_workers=max(len(checks), 1)) as executor:
+        futures = {name: executor.submit(poll, name, check) for name, check in checks.items()}
+        done, _ = wait(futures.values(), return_when=FIRST_EXCEPTION)
+        for future in done:
+            if future.exception():
+                stop.set()
+                raise future.exception()
+    return {name: future.result() for name, future in futures.items()}
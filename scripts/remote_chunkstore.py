@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Content-addressed, deduplicating backup repository for backup.py.
+
+Runs on the VPS (backup.py passes the source to ``python3 -c``). A dump
+read from stdin is cut into content-defined chunks at line boundaries, so
+an insertion only changes the chunks around it. Each chunk is stored once
+under ``chunks/<2-hex prefix>/<sha256>`` (zlib-compressed) and shared by
+every snapshot that contains it; ``snapshots/<name>.json`` lists a
+snapshot's chunks in order. ``lock`` in the repo is held shared by store
+and cat and exclusively by forget, so forget never deletes a chunk that a
+running store has just written or skipped as already present.
+
+Usage:
+    store <repo> <name> [level]   read a dump from stdin, print stats JSON
+    cat <repo> <name>             write a snapshot's contents to stdout
+    info <repo> <name>            print a snapshot's manifest summary
+    list <repo>                   print every snapshot summary as JSON
+    forget <repo> [name ...]      drop snapshots and unreferenced chunks
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import fcntl
+import hashlib
+from contextlib import contextmanager
+
+MIN_CHUNK = 64 * 1024
+MAX_CHUNK = 8 * 1024 * 1024
+# A line ends a chunk when its hash matches, ~1 in 8192 lines (~1MiB for pg_dump output)
+BOUNDARY_MASK = 0x1FFF
+
+
+def chunk_path(repo, digest):
+    return os.path.join(repo, "chunks", digest[:2], digest)
+
+
+def snapshot_path(repo, name):
+    return os.path.join(repo, "snapshots", f"{name}.json")
+
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp.{os.getpid()}"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+@contextmanager
+def repo_lock(repo, exclusive=False):
+    os.makedirs(repo, exist_ok=True)
+    with open(os.path.join(repo, "lock"), "a") as f:
+        # Released when the file is closed, including when the process dies
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def iter_chunks(stream):
+    chunk = []
+    size = 0
+    for line in stream:
+        chunk.append(line)
+        size += len(line)
+        if size >= MAX_CHUNK or (size >= MIN_CHUNK and zlib.crc32(line) & BOUNDARY_MASK == 0):
+            yield b"".join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield b"".join(chunk)
+
+
+def summary(manifest):
+    return {
+        "name": manifest["name"],
+        "created": manifest["created"],
+        "size": manifest["size"],
+        "chunks": len(manifest["chunks"]),
+        "new_chunks": manifest.get("new_chunks", 0),
+        "new_bytes": manifest.get("new_bytes", 0),
+        "sha256": manifest.get("sha256"),
+    }
+
+
+def store(repo, name, level=6):
+    manifest = {"name": name, "created": time.time(), "size": 0, "chunks": [], "new_chunks": 0, "new_bytes": 0}
+    stream_hash = hashlib.sha256()
+    with repo_lock(repo):
+        for chunk in iter_chunks(sys.stdin.buffer):
+            stream_hash.update(chunk)
+            digest = hashlib.sha256(chunk).hexdigest()
+            path = chunk_path(repo, digest)
+            if not os.path.exists(path):
+                compressed = zlib.compress(chunk, level)
+                write_atomic(path, compressed)
+                manifest["new_chunks"] += 1
+                manifest["new_bytes"] += len(compressed)
+            manifest["chunks"].append([digest, len(chunk)])
+            manifest["size"] += len(chunk)
+
+        manifest["sha256"] = stream_hash.hexdigest()
+        # The manifest is written last, so a snapshot only exists once all its chunks do
+        write_atomic(snapshot_path(repo, name), json.dumps(manifest).encode())
+    json.dump(summary(manifest), sys.stdout)
+
+
+def load_manifest(repo, name):
+    with open(snapshot_path(repo, name)) as f:
+        return json.load(f)
+
+
+def cat(repo, name):
+    out = sys.stdout.buffer
+    with repo_lock(repo):
+        for digest, _ in load_manifest(repo, name)["chunks"]:
+            with open(chunk_path(repo, digest), "rb") as f:
+                out.write(zlib.decompress(f.read()))
+    out.flush()
+
+
+def list_snapshots(repo):
+    directory = os.path.join(repo, "snapshots")
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(entry[:-5] for entry in os.listdir(directory) if entry.endswith(".json"))
+    return [load_manifest(repo, name) for name in names]
+
+
+def forget(repo, names):
+    removed = []
+    freed_chunks = freed_bytes = 0
+    # Waits for running stores, whose chunks are not referenced by any manifest yet
+    with repo_lock(repo, exclusive=True):
+        for name in names:
+            if os.path.exists(snapshot_path(repo, name)):
+                os.remove(snapshot_path(repo, name))
+                removed.append(name)
+        manifests = list_snapshots(repo)
+
+        referenced = {digest for m in manifests for digest, _ in m["chunks"]}
+        chunks_dir = os.path.join(repo, "chunks")
+        for prefix in os.listdir(chunks_dir) if os.path.isdir(chunks_dir) else []:
+            for digest in os.listdir(os.path.join(chunks_dir, prefix)):
+                if digest not in referenced:
+                    path = os.path.join(chunks_dir, prefix, digest)
+                    freed_bytes += os.path.getsize(path)
+                    os.remove(path)
+                    freed_chunks += 1
+    json.dump({"removed": removed, "freed_chunks": freed_chunks, "freed_bytes": freed_bytes}, sys.stdout)
+
+
+def main():
+    command, repo = sys.argv[1], sys.argv[2]
+    if command == "store":
+        store(repo, sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else 6)
+    elif command == "cat":
+        cat(repo, sys.argv[3])
+    elif command == "info":
+        json.dump(summary(load_manifest(repo, sys.argv[3])), sys.stdout)
+    elif command == "list":
+        json.dump([summary(m) for m in list_snapshots(repo)], sys.stdout)
+    elif command == "forget":
+        forget(repo, sys.argv[3:])
+    else:
+        sys.exit(f"unknown command: {command}")
+
+
+if __name__ == "__main__":
+    main()
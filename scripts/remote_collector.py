@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Remote metrics collector for monitor.py.
+
+Shipped to the VPS over stdin (``python3 - <project_dir>``) and run in a
+single SSH round-trip. Reads CPU, memory and disk straight from /proc and
+statvfs, takes container state from ``docker inspect`` instead of exec'ing
+into each container, and prints one JSON document on stdout.
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+
+
+def read_cpu_times():
+    with open("/proc/stat") as f:
+        fields = [int(value) for value in f.readline().split()[1:]]
+    idle = fields[3] + fields[4]  # idle + iowait
+    return idle, sum(fields)
+
+
+def cpu_percent(sample_interval=0.5):
+    idle_before, total_before = read_cpu_times()
+    time.sleep(sample_interval)
+    idle_after, total_after = read_cpu_times()
+    total = total_after - total_before
+    if total <= 0:
+        return 0.0
+    return round(100.0 * (1 - (idle_after - idle_before) / total), 1)
+
+
+def memory_usage():
+    meminfo = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            key, value = line.split(":", 1)
+            meminfo[key] = int(value.split()[0]) * 1024
+    total = meminfo["MemTotal"]
+    used = total - meminfo.get("MemAvailable", meminfo["MemFree"])
+    return {"used": used, "total": total, "percent": round(100.0 * used / total, 1)}
+
+
+def disk_usage(path="/"):
+    stat = os.statvfs(path)
+    total = stat.f_blocks * stat.f_frsize
+    used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+    return {"used": used, "total": total, "percent": round(100.0 * used / total, 1) if total else 0.0}
+
+
+def load_average():
+    with open("/proc/loadavg") as f:
+        return [float(value) for value in f.read().split()[:3]]
+
+
+def run(args):
+    try:
+        return subprocess.run(args, capture_output=True, text=True)
+    except OSError as e:
+        return subprocess.CompletedProcess(args, 127, "", str(e))
+
+
+def docker_disk_usage():
+    result = run(["docker", "system", "df", "--format", "{{json .}}"])
+    if result.returncode != 0:
+        return []
+    return [json.loads(line) for line in result.stdout.splitlines() if line.strip()]
+
+
+def service_states(project_dir, compose_file):
+    ids = run(["docker-compose", "-f", os.path.join(project_dir, compose_file), "ps", "-q"])
+    container_ids = ids.stdout.split()
+    if ids.returncode != 0 or not container_ids:
+        return {}
+    inspect = run(["docker", "inspect", *container_ids])
+    if inspect.returncode != 0:
+        return {}
+
+    services = {}
+    for container in json.loads(inspect.stdout):
+        state = container["State"]
+        labels = container["Config"].get("Labels") or {}
+        service = labels.get("com.docker.compose.service", container["Name"].lstrip("/"))
+        services[service] = {
+            "container": container["Name"].lstrip("/"),
+            "status": state["Status"],
+            "health": (state.get("Health") or {}).get("Status"),
+            "started_at": state.get("StartedAt"),
+            "restart_count": container.get("RestartCount", 0),
+        }
+    return services
+
+
+def main():
+    project_dir = sys.argv[1] if len(sys.argv) > 1 else "/opt/wms"
+    compose_file = sys.argv[2] if len(sys.argv) > 2 else "docker-compose.production.yml"
+
+    snapshot = {
+        "timestamp": time.time(),
+        "cpu_percent": cpu_percent(),
+        "load_average": load_average(),
+        "memory": memory_usage(),
+        "disk": disk_usage("/"),
+        "docker_disk": docker_disk_usage(),
+        "services": service_states(project_dir, compose_file),
+    }
+    json.dump(snapshot, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Remote log filter for monitor.py logs.
+
+Shipped as ``python3 -u -c <source>`` at the end of a
+``docker-compose logs -t`` pipeline on the VPS, so only matching lines
+cross the wire. Compose lines look like ``<container> | <RFC 3339 time>
+<message>``; the level and regex filters apply to the message, and
+matching lines are written through unchanged as they arrive. Time windows
+are left to docker-compose logs --since/--until.
+"""
+
+import re
+import sys
+
+# First match wins; anything else is info
+LEVEL_PATTERNS = [
+    ("error", re.compile(r"\b(ERROR|FATAL|PANIC|CRITICAL|Error)\b|\bstatus[=: ]+5\d\d\b| 5\d\d ")),
+    ("warn", re.compile(r"\b(WARN|WARNING|Warning)\b|\bstatus[=: ]+4\d\d\b| 4\d\d ")),
+]
+LEVEL_RANK = {"info": 0, "warn": 1, "error": 2}
+
+
+def split_line(line):
+    """(container, timestamp, message) of a compose log line"""
+    prefix, separator, rest = line.partition("| ")
+    if not separator:
+        return None, "", line
+    timestamp, _, message = rest.partition(" ")
+    return prefix.strip(), timestamp, message
+
+
+def line_level(message):
+    for level, pattern in LEVEL_PATTERNS:
+        if pattern.search(message):
+            return level
+    return "info"
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--level", default="info", choices=list(LEVEL_RANK))
+    parser.add_argument("--grep")
+    args = parser.parse_args()
+
+    pattern = re.compile(args.grep) if args.grep else None
+    minimum = LEVEL_RANK[args.level]
+    for line in sys.stdin:
+        _, _, message = split_line(line)
+        if minimum and LEVEL_RANK[line_level(message)] < minimum:
+            continue
+        if pattern and not pattern.search(message):
+            continue
+        sys.stdout.write(line)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
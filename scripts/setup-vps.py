@@ -2,19 +2,131 @@
 
 import os
 import sys
-import subprocess
+import json
+import hashlib
+import datetime
 import argparse
 
+from transport import transport_for
+from timing import RunTimer
+
+# Fingerprints of the desired state each step last converged to
+SETUP_STATE_PATH = "/var/lib/wms-setup/state.json"
+
+ESSENTIAL_PACKAGES = [
+    "curl", "wget", "git", "unzip", "htop", "nano", "vim",
+    "ufw", "fail2ban", "certbot", "python3-certbot-nginx",
+    "pigz", "zstd"
+]
+
+FIREWALL_RULES = ["22/tcp", "80/tcp", "443/tcp"]  # SSH, HTTP, HTTPS
+
+DIRECTORIES = [
+    "/opt/wms",
+    "/opt/wms/backup",
+    "/opt/wms/logs",
+    "/opt/wms/ssl"
+]
+
+JAIL_CONFIG = """
+[sshd]
+enabled = true
+port = ssh
+filter = sshd
+logpath = /var/log/auth.log
+maxretry = 3
+bantime = 3600
+findtime = 600
+"""
+
+LIMITS_CONFIG = """
+* soft nofile 65536
+* hard nofile 65536
+root soft nofile 65536
+root hard nofile 65536
+"""
+
+SYSCTL_CONFIG = """
+# Network optimizations
+net.core.rmem_max = 16777216
+net.core.wmem_max = 16777216
+net.ipv4.tcp_rmem = 4096 12582912 16777216
+net.ipv4.tcp_wmem = 4096 12582912 16777216
+net.core.netdev_max_backlog = 5000
+net.ipv4.tcp_congestion_control = bbr
+
+# Security settings
+net.ipv4.conf.all.send_redirects = 0
+net.ipv4.conf.default.send_redirects = 0
+net.ipv4.conf.all.accept_redirects = 0
+net.ipv4.conf.default.accept_redirects = 0
+net.ipv4.conf.all.accept_source_route = 0
+net.ipv4.conf.default.accept_source_route = 0
+"""
+
+SWAP_SYSCTL_CONFIG = """
+vm.swappiness = 10
+"""
+
+LOGROTATE_CONFIG = """
+/opt/wms/logs/*.log {
+    daily
+    missingok
+    rotate 30
+    compress
+    delaycompress
+    notifempty
+    create 644 root root
+}
+"""
+
+# Drop-in files replace lines older versions appended to the main config files
+MANAGED_FILES = {
+    "jail": "/etc/fail2ban/jail.local",
+    "limits": "/etc/security/limits.d/99-wms.conf",
+    "sysctl": "/etc/sysctl.d/99-wms.conf",
+    "swap_sysctl": "/etc/sysctl.d/99-wms-swap.conf",
+    "logrotate": "/etc/logrotate.d/wms",
+}
+
+
+def fingerprint(desired):
+    """Stable hash of a step's desired state"""
+    return hashlib.sha256(json.dumps(desired, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def write_file_command(path, content):
+    return f"cat > {path} << 'EOF'\n{content}EOF"
+
+
+def file_matches_command(path, content):
+    """Shell test that succeeds when path holds exactly content"""
+    digest = hashlib.sha256(content.encode()).hexdigest()
+    return f"echo '{digest}  {path}' | sha256sum -c --status"
+
+
+def remove_lines_command(path, content):
+    """Drop lines that older setup runs appended to path; a missing path is left missing"""
+    patterns = " ".join(f"-e '{line}'" for line in content.splitlines() if line.strip())
+    # Succeeds without touching anything when the file is absent, so cleanup never creates it
+    return (f"[ ! -f {path} ] || {{ grep -vxF {patterns} {path} > {path}.wms-tmp; "
+            f"cat {path}.wms-tmp > {path} && rm -f {path}.wms-tmp; }}")
+
+
 class VPSSetup:
-    def __init__(self, host, user="root"):
+    def __init__(self, host, user="root", swap_size="2G", force=False):
         self.host = host
         self.user = user
+        self.swap_size = swap_size
+        self.force = force
+        self.transport = transport_for(host, user)
+        self.timer = RunTimer("setup", host)
+        self.transport.timer = self.timer
         
     def run_remote_command(self, command, check=True):
         """Run command on remote server via SSH"""
-        ssh_command = f"ssh {self.user}@{self.host} '{command}'"
         print(f"[REMOTE] {command}")
-        result = subprocess.run(ssh_command, shell=True, capture_output=True, text=True)
+        result = self.transport.run(command)
         if check and result.returncode != 0:
             print(f"Error: {result.stderr}")
             sys.exit(1)
@@ -29,11 +141,7 @@ class VPSSetup:
     def install_essential_packages(self):
         """Install essential packages"""
         print("\n=== Installing essential packages ===")
-        packages = [
-            "curl", "wget", "git", "unzip", "htop", "nano", "vim",
-            "ufw", "fail2ban", "certbot", "python3-certbot-nginx"
-        ]
-        package_list = " ".join(packages)
+        package_list = " ".join(ESSENTIAL_PACKAGES)
         self.run_remote_command(f"apt install -y {package_list}")
         print("Essential packages installed successfully!")
     
@@ -121,9 +229,8 @@ class VPSSetup:
         self.run_remote_command("ufw default allow outgoing")
         
         # Allow essential ports
-        self.run_remote_command("ufw allow 22/tcp")    # SSH
-        self.run_remote_command("ufw allow 80/tcp")    # HTTP
-        self.run_remote_command("ufw allow 443/tcp")   # HTTPS
+        for rule in FIREWALL_RULES:
+            self.run_remote_command(f"ufw allow {rule}")
         
         # Enable UFW
         self.run_remote_command("ufw --force enable")
@@ -135,18 +242,7 @@ class VPSSetup:
         print("\n=== Configuring Fail2Ban ===")
         
         # Create SSH jail configuration
-        jail_config = """
-[sshd]
-enabled = true
-port = ssh
-filter = sshd
-logpath = /var/log/auth.log
-maxretry = 3
-bantime = 3600
-findtime = 600
-"""
-        
-        self.run_remote_command(f"cat > /etc/fail2ban/jail.local << 'EOF'\n{jail_config}EOF")
+        self.run_remote_command(write_file_command(MANAGED_FILES["jail"], JAIL_CONFIG))
         
         # Enable and start Fail2Ban
         self.run_remote_command("systemctl enable fail2ban")
@@ -154,10 +250,16 @@ findtime = 600
         
         print("Fail2Ban configured successfully!")
     
-    def create_swap(self, size="2G"):
+    def create_swap(self):
         """Create swap file if not exists"""
+        size = self.swap_size
         print(f"\n=== Creating swap file ({size}) ===")
         
+        # Configure swappiness
+        self.run_remote_command(remove_lines_command("/etc/sysctl.conf", "vm.swappiness=10"))
+        self.run_remote_command(write_file_command(MANAGED_FILES["swap_sysctl"], SWAP_SYSCTL_CONFIG))
+        self.run_remote_command(f"sysctl -p {MANAGED_FILES['swap_sysctl']}")
+        
         # Check if swap already exists
         swap_check = self.run_remote_command("swapon --show", check=False)
         if swap_check.stdout.strip():
@@ -171,10 +273,7 @@ findtime = 600
         self.run_remote_command("swapon /swapfile")
         
         # Make swap permanent
-        self.run_remote_command("echo '/swapfile none swap sw 0 0' >> /etc/fstab")
-        
-        # Configure swappiness
-        self.run_remote_command("echo 'vm.swappiness=10' >> /etc/sysctl.conf")
+        self.run_remote_command("grep -q '^/swapfile ' /etc/fstab || echo '/swapfile none swap sw 0 0' >> /etc/fstab")
         
         print(f"Swap file ({size}) created successfully!")
     
@@ -183,36 +282,13 @@ findtime = 600
         print("\n=== Applying system optimizations ===")
         
         # Increase file limits
-        limits_config = """
-* soft nofile 65536
-* hard nofile 65536
-root soft nofile 65536
-root hard nofile 65536
-"""
-        
-        self.run_remote_command(f"cat >> /etc/security/limits.conf << 'EOF'\n{limits_config}EOF")
+        self.run_remote_command(remove_lines_command("/etc/security/limits.conf", LIMITS_CONFIG))
+        self.run_remote_command(write_file_command(MANAGED_FILES["limits"], LIMITS_CONFIG))
         
         # Optimize network settings
-        sysctl_config = """
-# Network optimizations
-net.core.rmem_max = 16777216
-net.core.wmem_max = 16777216
-net.ipv4.tcp_rmem = 4096 12582912 16777216
-net.ipv4.tcp_wmem = 4096 12582912 16777216
-net.core.netdev_max_backlog = 5000
-net.ipv4.tcp_congestion_control = bbr
-
-# Security settings
-net.ipv4.conf.all.send_redirects = 0
-net.ipv4.conf.default.send_redirects = 0
-net.ipv4.conf.all.accept_redirects = 0
-net.ipv4.conf.default.accept_redirects = 0
-net.ipv4.conf.all.accept_source_route = 0
-net.ipv4.conf.default.accept_source_route = 0
-"""
-        
-        self.run_remote_command(f"cat >> /etc/sysctl.conf << 'EOF'\n{sysctl_config}EOF")
-        self.run_remote_command("sysctl -p")
+        self.run_remote_command(remove_lines_command("/etc/sysctl.conf", SYSCTL_CONFIG))
+        self.run_remote_command(write_file_command(MANAGED_FILES["sysctl"], SYSCTL_CONFIG))
+        self.run_remote_command(f"sysctl -p {MANAGED_FILES['sysctl']}")
         
         print("System optimizations applied successfully!")
     
@@ -220,15 +296,7 @@ net.ipv4.conf.default.accept_source_route = 0
         """Create necessary directories"""
         print("\n=== Creating directories ===")
         
-        directories = [
-            "/opt/wms",
-            "/opt/wms/backup",
-            "/opt/wms/logs",
-            "/opt/wms/ssl"
-        ]
-        
-        for directory in directories:
-            self.run_remote_command(f"mkdir -p {directory}")
+        self.run_remote_command(f"mkdir -p {' '.join(DIRECTORIES)}")
         
         print("Directories created successfully!")
     
@@ -236,19 +304,7 @@ net.ipv4.conf.default.accept_source_route = 0
         """Configure log rotation"""
         print("\n=== Configuring log rotation ===")
         
-        logrotate_config = """
-/opt/wms/logs/*.log {
-    daily
-    missingok
-    rotate 30
-    compress
-    delaycompress
-    notifempty
-    create 644 root root
-}
-"""
-        
-        self.run_remote_command(f"cat > /etc/logrotate.d/wms << 'EOF'\n{logrotate_config}EOF")
+        self.run_remote_command(write_file_command(MANAGED_FILES["logrotate"], LOGROTATE_CONFIG))
         
         print("Log rotation configured successfully!")
     
@@ -279,36 +335,86 @@ net.ipv4.conf.default.accept_source_route = 0
         print("- Monitor: make watch")
         print("\nNote: Docker and Nginx were already installed and have been verified.")
     
+    def step_plan(self):
+        """Each step with its desired state and a shell test that it still holds"""
+        return [
+            # Upgrades are re-applied once a day
+            (self.update_system, {"day": datetime.date.today().isoformat()}, "true"),
+            (self.install_essential_packages, {"packages": ESSENTIAL_PACKAGES},
+             f"! dpkg-query -W -f='${{db:Status-Status}}\\n' {' '.join(ESSENTIAL_PACKAGES)} 2>&1 | grep -qvx installed"),
+            (self.install_docker, {}, "systemctl is-active --quiet docker"),
+            (self.install_nginx, {}, "systemctl is-active --quiet nginx"),
+            (self.setup_firewall, {"rules": FIREWALL_RULES}, "ufw status | grep -qx 'Status: active'"),
+            (self.setup_fail2ban, {"jail": JAIL_CONFIG},
+             f"{file_matches_command(MANAGED_FILES['jail'], JAIL_CONFIG)} && systemctl is-active --quiet fail2ban"),
+            (self.create_swap, {"size": self.swap_size, "sysctl": SWAP_SYSCTL_CONFIG},
+             f"swapon --show | grep -q . && {file_matches_command(MANAGED_FILES['swap_sysctl'], SWAP_SYSCTL_CONFIG)}"),
+            (self.optimize_system, {"limits": LIMITS_CONFIG, "sysctl": SYSCTL_CONFIG},
+             f"{file_matches_command(MANAGED_FILES['limits'], LIMITS_CONFIG)} && {file_matches_command(MANAGED_FILES['sysctl'], SYSCTL_CONFIG)}"),
+            (self.setup_directories, {"directories": DIRECTORIES}, " && ".join(f"test -d {d}" for d in DIRECTORIES)),
+            (self.setup_logrotate, {"config": LOGROTATE_CONFIG}, file_matches_command(MANAGED_FILES["logrotate"], LOGROTATE_CONFIG)),
+        ]
+    
+    def read_setup_state(self, plan):
+        """Fetch the recorded fingerprints and run every drift probe in one round-trip"""
+        probes = "\n".join(
+            f"({probe}) >/dev/null 2>&1 && echo '{step.__name__} ok' || echo '{step.__name__} drift'"
+            for step, _, probe in plan
+        )
+        result = self.run_remote_command(f"cat {SETUP_STATE_PATH} 2>/dev/null || echo '{{}}'\necho ---\n{probes}")
+        state_json, _, probe_output = result.stdout.partition("---\n")
+        try:
+            state = json.loads(state_json)
+        except ValueError:
+            state = {}
+        healthy = {line.split()[0] for line in probe_output.splitlines() if line.endswith(" ok")}
+        return state, healthy
+    
+    def write_setup_state(self, state):
+        directory = os.path.dirname(SETUP_STATE_PATH)
+        content = json.dumps(state, indent=2) + "\n"
+        self.run_remote_command(f"mkdir -p {directory} && {write_file_command(SETUP_STATE_PATH, content)}")
+    
     def run_full_setup(self):
-        """Run complete VPS setup"""
+        """Run complete VPS setup, applying only steps whose desired state drifted"""
         print(f"Starting VPS setup for {self.host}...")
+        status = "failed"
         
         try:
-            self.update_system()
-            self.install_essential_packages()
-            self.install_docker()
-            self.install_nginx()
-            self.setup_firewall()
-            self.setup_fail2ban()
-            self.create_swap()
-            self.optimize_system()
-            self.setup_directories()
-            self.setup_logrotate()
+            plan = self.step_plan()
+            state, healthy = self.read_setup_state(plan)
+            applied = 0
+            for step, desired, _ in plan:
+                name = step.__name__
+                expected = fingerprint(desired)
+                if not self.force and state.get(name) == expected and name in healthy:
+                    print(f"✓ {name} is up to date")
+                    continue
+                with self.timer.stage(name):
+                    step()
+                state[name] = expected
+                self.write_setup_state(state)
+                applied += 1
+            print(f"\n{applied} of {len(plan)} steps applied")
             self.display_summary()
+            status = "ok"
             
         except Exception as e:
             print(f"\nSetup failed: {e}")
             sys.exit(1)
+        finally:
+            self.timer.finish(status)
 
 def main():
     parser = argparse.ArgumentParser(description='Setup VPS for WMS deployment')
     parser.add_argument('--host', default='forest-vps', help='VPS hostname or IP')
     parser.add_argument('--user', default='root', help='SSH user')
     parser.add_argument('--swap-size', default='2G', help='Swap file size')
+    parser.add_argument('--force', action='store_true', help='Re-apply every step even if it looks up to date')
     
     args = parser.parse_args()
     
-    setup = VPSSetup(args.host, args.user)
+    setup = VPSSetup(args.host, args.user, args.swap_size, args.force)
     setup.run_full_setup()
 
 if __name__ == "__main__":
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import fnmatch
+import hashlib
+import tempfile
+
+# Same set the rsync-based sync used to skip
+SYNC_EXCLUDES = [".git", "node_modules", ".next", "dist", "build", ".env*"]
+
+MANIFEST_NAME = ".deploy-manifest.json"
+DELETIONS_NAME = ".deploy-deletions"
+
+
+def is_excluded(name, excludes=SYNC_EXCLUDES):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in excludes)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path, data):
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def build_manifest(root, cache_path, excludes=SYNC_EXCLUDES):
+    """Map every synced path under root to its content hash.
+
+    Hashes are cached by (size, mtime) in cache_path, so only files that
+    changed since the last deploy are read. Returns (manifest, rehashed).
+    """
+    cache = load_json(cache_path, {})
+    manifest = {}
+    new_cache = {}
+    rehashed = 0
+
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not is_excluded(d, excludes))
+        for filename in filenames:
+            if is_excluded(filename, excludes):
+                continue
+            path = os.path.join(directory, filename)
+            if not os.path.isfile(path):
+                continue
+            relative = os.path.relpath(path, root).replace(os.sep, "/")
+            stat = os.stat(path)
+            cached = cache.get(relative)
+            if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+                digest = cached[2]
+            else:
+                digest = file_sha256(path)
+                rehashed += 1
+            manifest[relative] = digest
+            new_cache[relative] = [stat.st_size, stat.st_mtime_ns, digest]
+
+    save_json(cache_path, new_cache)
+    return manifest, rehashed
+
+
+def diff_manifests(local, remote):
+    """Return (changed, deleted) paths needed to turn remote into local"""
+    changed = sorted(path for path, digest in local.items() if remote.get(path) != digest)
+    deleted = sorted(path for path in remote if path not in local)
+    return changed, deleted
+
+
+class CountingWriter:
+    """File-like wrapper that counts the bytes written through it"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes = 0
+
+    def write(self, data):
+        self.raw.write(data)
+        self.bytes += len(data)
+        return len(data)
+
+    def flush(self):
+        self.raw.flush()
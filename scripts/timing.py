@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Stage and command timing for deploy.py and setup-vps.py.
+
+Every stage and every remote or local command is written as one JSON line
+to ``<state dir>/runs/<kind>-<timestamp>.jsonl`` as it finishes. When the
+run ends, its per-stage totals are appended to ``timing-history.jsonl``,
+and a table compares each stage against the median of earlier runs.
+"""
+
+import json
+import time
+import datetime
+import statistics
+import subprocess
+from contextlib import contextmanager
+
+from transport import local_state_dir
+
+# Earlier successful runs a stage is compared against
+HISTORY_WINDOW = 10
+# A stage is flagged when it takes this much longer than its median (and at least MIN_REGRESSION seconds more)
+REGRESSION_FACTOR = 1.5
+MIN_REGRESSION = 2.0
+
+
+def format_bytes(size):
+    """Format a byte count with a binary unit suffix"""
+    for unit in ["B", "Ki", "Mi", "Gi"]:
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}Ti"
+
+
+def current_release():
+    """Short git revision of the working tree, or None outside a checkout"""
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+class RunTimer:
+    """Collects timings for one deploy or setup run"""
+
+    def __init__(self, kind, host):
+        self.kind = kind
+        self.host = host
+        self.started = time.time()
+        self.release = current_release()
+        self.stages = []
+        self._stack = []
+        state_dir = local_state_dir(host)
+        (state_dir / "runs").mkdir(exist_ok=True)
+        stamp = datetime.datetime.fromtimestamp(self.started).strftime("%Y%m%d_%H%M%S")
+        self.log_path = state_dir / "runs" / f"{kind}-{stamp}.jsonl"
+        self.history_path = state_dir / "timing-history.jsonl"
+
+    def emit(self, event):
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(event) + "\n")
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block; nested stages are named parent/child"""
+        stats = {
+            "name": "/".join([s["name"] for s in self._stack[-1:]] + [name]),
+            "depth": len(self._stack),
+            "commands": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "status": "ok",
+        }
+        self._stack.append(stats)
+        self.stages.append(stats)
+        started = time.monotonic()
+        try:
+            yield stats
+        except BaseException:
+            stats["status"] = "failed"
+            raise
+        finally:
+            stats["duration"] = time.monotonic() - started
+            self._stack.pop()
+            self.emit({"event": "stage", **stats})
+
+    def record_command(self, command, duration, returncode, bytes_in=0, bytes_out=0, where="remote"):
+        """Log one command and add it to every enclosing stage"""
+        for stats in self._stack:
+            stats["commands"] += 1
+            stats["bytes_in"] += bytes_in
+            stats["bytes_out"] += bytes_out
+        self.emit({
+            "event": "command",
+            "where": where,
+            "stage": self._stack[-1]["name"] if self._stack else None,
+            "command": command,
+            "duration": round(duration, 3),
+            "returncode": returncode,
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+        })
+
+    def load_history(self):
+        try:
+            with open(self.history_path) as f:
+                runs = [json.loads(line) for line in f if line.strip()]
+        except OSError:
+            return []
+        return [run for run in runs if run["kind"] == self.kind and run["status"] == "ok"][-HISTORY_WINDOW:]
+
+    def finish(self, status="ok"):
+        """Append the run to the history file and print the summary table"""
+        history = self.load_history()
+        total = time.time() - self.started
+        self.emit({"event": "run", "kind": self.kind, "status": status, "duration": total})
+        with open(self.history_path, "a") as f:
+            f.write(json.dumps({
+                "kind": self.kind,
+                "started": self.started,
+                "release": self.release,
+                "status": status,
+                "duration": total,
+                "stages": {stats["name"]: stats["duration"] for stats in self.stages},
+            }) + "\n")
+        self.print_summary(history, total, status)
+
+    def print_summary(self, history, total, status):
+        print(f"\n=== Timing ({self.kind}, {status}) ===")
+        print(f"{'Stage':<28}{'Time':>9}{'Cmds':>6}{'Sent':>10}{'Recv':>10}  vs median")
+        rows = [(stats["name"], stats["depth"], stats["duration"], stats) for stats in self.stages]
+        rows.append(("total", 0, total, None))
+        for name, depth, duration, stats in rows:
+            previous = [run["duration"] if stats is None else run["stages"].get(name) for run in history]
+            previous = [d for d in previous if d is not None]
+            comparison = "-"
+            if previous:
+                median = statistics.median(previous)
+                comparison = f"{duration - median:+.1f}s"
+                if duration > median * REGRESSION_FACTOR and duration - median > MIN_REGRESSION:
+                    comparison += "  REGRESSION"
+            label = ("  " * depth + name.rsplit("/", 1)[-1])[:27]
+            if stats is None:
+                print(f"{label:<28}{duration:>8.1f}s{'':>26}  {comparison}")
+            else:
+                failed = "  FAILED" if stats["status"] == "failed" else ""
+                print(f"{label:<28}{duration:>8.1f}s{stats['commands']:>6}{format_bytes(stats['bytes_out']):>10}"
+                      f"{format_bytes(stats['bytes_in']):>10}  {comparison}{failed}")
+        print(f"Run log: {self.log_path}")
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import time
+import atexit
+import shutil
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+
+# Absolute remote paths that LocalTransport maps into its root directory
+LOCAL_MAPPED_PATHS = re.compile(r"(?<![\w.~/-])(/opt/|/etc/|/var/lib/|/var/log/|/swapfile\b)")
+
+# Commands replaced by scripts/fake_docker.py for LocalTransport; system tools become no-ops
+FAKE_TOOLS = ["docker", "docker-compose", "curl", "ssh", "fallocate"]
+NOOP_TOOLS = [
+    "apt", "apt-get", "dpkg-query", "systemctl", "ufw", "sysctl",
+    "mkswap", "swapon", "nginx", "certbot",
+]
+
+# Files a provisioned host already has, created empty in a fresh LocalTransport root
+LOCAL_ROOT_SKELETON = [
+    "etc/fstab", "etc/sysctl.conf", "etc/security/limits.conf",
+    "etc/fail2ban/", "etc/sysctl.d/", "etc/security/limits.d/", "etc/logrotate.d/",
+    "etc/nginx/sites-available/", "etc/nginx/sites-enabled/",
+]
+
+
+def local_state_dir(host):
+    """Directory on the operator machine for per-host ops state"""
+    root = Path(os.environ.get("WMS_STATE_DIR", Path.home() / ".wms"))
+    path = root / host
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def map_local_paths(command, root):
+    """Point remote absolute paths in a shell command at the local root"""
+    return LOCAL_MAPPED_PATHS.sub(lambda m: f"{root}{m.group(1)}", command)
+
+
+def transport_for(host, user="root"):
+    """SSH transport, or a LocalTransport when WMS_TRANSPORT=local.
+
+    The local transport runs against WMS_LOCAL_ROOT (default: a directory in
+    the host's state dir); WMS_LOCAL_LATENCY adds a delay per round-trip and
+    WMS_DOCKER_DELAY to slow fake docker operations.
+    """
+    if os.environ.get("WMS_TRANSPORT", "ssh") == "local":
+        root = os.environ.get("WMS_LOCAL_ROOT") or local_state_dir(host) / "local-root"
+        return LocalTransport(
+            host, user, root,
+            latency=float(os.environ.get("WMS_LOCAL_LATENCY", "0")),
+            docker_delay=float(os.environ.get("WMS_DOCKER_DELAY", "0"))
+        )
+    return SSHTransport(host, user)
+
+
+class TransportStats:
+    """Round-trips, wall time and bytes moved through one transport"""
+
+    def __init__(self):
+        self.round_trips = 0
+        self.seconds = 0.0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+    def record(self, duration, bytes_out=0, bytes_in=0):
+        self.round_trips += 1
+        self.seconds += duration
+        self.bytes_out += bytes_out
+        self.bytes_in += bytes_in
+
+    def summary(self):
+        return (f"{self.round_trips} round-trips, {self.seconds:.2f}s, "
+                f"{self.bytes_out} bytes sent, {self.bytes_in} bytes received")
+
+
+class Transport:
+    """Common bookkeeping for the ways ops scripts reach a host.
+
+    Subclasses provide ``run`` (returns a text CompletedProcess), ``open``
+    (returns a Popen for streaming), ``rsh_command`` and ``close``. close is
+    registered with atexit and may also be called explicitly, so it only
+    acts (and prints stats) the first time; the transport stays usable.
+    """
+
+    def __init__(self, host, user):
+        self.host = host
+        self.user = user
+        self.target = f"{user}@{host}"
+        # Optional timing.RunTimer that every run() is reported to
+        self.timer = None
+        self.stats = TransportStats()
+        self.report_stats = bool(os.environ.get("WMS_TRANSPORT_STATS"))
+        self.closed = False
+
+    def record(self, command, started, result, input=None):
+        duration = time.monotonic() - started
+        bytes_out = len((input or "").encode())
+        bytes_in = len(result.stdout.encode()) + len(result.stderr.encode())
+        self.stats.record(duration, bytes_out, bytes_in)
+        if self.timer:
+            self.timer.record_command(command, duration, result.returncode, bytes_out=bytes_out, bytes_in=bytes_in)
+
+    def record_stream(self, command, duration, returncode, bytes_out=0, bytes_in=0):
+        """Account for the data moved through a command started with open()"""
+        self.stats.seconds += duration
+        self.stats.bytes_out += bytes_out
+        self.stats.bytes_in += bytes_in
+        if self.timer:
+            self.timer.record_command(command, duration, returncode, bytes_out=bytes_out, bytes_in=bytes_in)
+
+    def print_stats(self):
+        if self.report_stats:
+            print(f"[TRANSPORT] {type(self).__name__} {self.target}: {self.stats.summary()}", file=sys.stderr)
+
+
+class SSHTransport(Transport):
+    """Persistent multiplexed SSH connection shared by the ops scripts.
+
+    The first command opens an OpenSSH ControlMaster connection; every later
+    command (and rsync, via ``rsh_command``) rides on the same authenticated
+    channel instead of paying a fresh handshake. The master is closed when the
+    run ends.
+    """
+
+    def __init__(self, host, user="root", persist="10m"):
+        super().__init__(host, user)
+        self.persist = persist
+        self._control_dir = tempfile.mkdtemp(prefix="wms-ssh-")
+        self.control_path = os.path.join(self._control_dir, "%C")
+        self._lock = threading.Lock()
+        self._connected = False
+        self._attempted = False
+        atexit.register(self.close)
+
+    def ssh_options(self):
+        """SSH options that attach to the shared master once it is up"""
+        options = ["-o", "ServerAliveInterval=30"]
+        if self._connected:
+            options += ["-o", f"ControlPath={self.control_path}", "-o", "ControlMaster=no"]
+        return options
+
+    def ssh_command(self, command=None):
+        """Build the ssh argv for a remote command"""
+        args = ["ssh", *self.ssh_options(), self.target]
+        if command is not None:
+            args.append(command)
+        return args
+
+    def rsh_command(self):
+        """Remote shell string for tools such as rsync -e"""
+        self.connect()
+        return " ".join(["ssh", *self.ssh_options()])
+
+    def connect(self):
+        """Open the master connection once per run"""
+        with self._lock:
+            if self._attempted:
+                return
+            self._attempted = True
+            os.makedirs(self._control_dir, exist_ok=True)
+            result = subprocess.run(
+                [
+                    "ssh", "-o", "ControlMaster=yes",
+                    "-o", f"ControlPath={self.control_path}",
+                    "-o", f"ControlPersist={self.persist}",
+                    "-fN", self.target,
+                ],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            # Fall back to per-command connections if multiplexing is unavailable
+            self._connected = result.returncode == 0
+
+    def run(self, command, input=None, timeout=None):
+        """Run command on the remote host over the shared connection"""
+        self.connect()
+        started = time.monotonic()
+        result = subprocess.run(
+            self.ssh_command(command), input=input, capture_output=True,
+            text=True, timeout=timeout
+        )
+        self.record(command, started, result, input)
+        return result
+
+    def open(self, command, **popen_kwargs):
+        """Start a remote command and return the Popen for streaming I/O"""
+        self.connect()
+        self.stats.round_trips += 1
+        return subprocess.Popen(self.ssh_command(command), **popen_kwargs)
+
+    def close(self):
+        """Close the master connection and remove its control socket"""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self._connected:
+                subprocess.run(
+                    ["ssh", "-o", f"ControlPath={self.control_path}", "-O", "exit", self.target],
+                    capture_output=True, text=True
+                )
+                self._connected = False
+            shutil.rmtree(self._control_dir, ignore_errors=True)
+        self.print_stats()
+
+
+class LocalTransport(Transport):
+    """Runs "remote" commands on this machine, for CI and benchmarks.
+
+    Commands execute with bash inside ``root``, which stands in for the VPS
+    filesystem: absolute paths under /opt, /etc, /var/lib and /var/log are
+    rewritten into it. docker, docker-compose, curl and ssh resolve to
+    scripts/fake_docker.py, and package, service and kernel tools (apt,
+    systemctl, ufw, sysctl, ...) do nothing, so no command touches this
+    machine outside root. ``latency`` is slept before every round-trip to
+    model the network.
+    """
+
+    def __init__(self, host, user="root", root=".", latency=0.0, docker_delay=0.0):
+        super().__init__(host, user)
+        self.root = Path(root).resolve()
+        self.latency = latency
+        self.shim_dir = self.root / ".shims"
+        self.shim_dir.mkdir(parents=True, exist_ok=True)
+        for entry in LOCAL_ROOT_SKELETON:
+            path = self.root / entry
+            if entry.endswith("/"):
+                path.mkdir(parents=True, exist_ok=True)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.touch()
+        fake_docker = Path(__file__).resolve().parent / "fake_docker.py"
+        for tool in FAKE_TOOLS + NOOP_TOOLS:
+            handler = tool if tool in FAKE_TOOLS else "noop"
+            shim = self.shim_dir / tool
+            shim.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{fake_docker}" {handler} "$@"\n')
+            shim.chmod(0o755)
+        self.env = dict(
+            os.environ,
+            PATH=f"{self.shim_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+            FAKE_DOCKER_ROOT=str(self.root),
+            FAKE_DOCKER_DELAY=str(docker_delay),
+        )
+        atexit.register(self.close)
+
+    def local_command(self, command):
+        return ["bash", "-c", map_local_paths(command, self.root)]
+
+    def rsh_command(self):
+        """Remote shell for rsync -e: the fake ssh runs the command locally"""
+        return str(self.shim_dir / "ssh")
+
+    def run(self, command, input=None, timeout=None):
+        """Run command locally as if on the remote host"""
+        started = time.monotonic()
+        time.sleep(self.latency)
+        result = subprocess.run(
+            self.local_command(command), input=input, capture_output=True,
+            text=True, timeout=timeout, cwd=self.root, env=self.env
+        )
+        self.record(command, started, result, input)
+        return result
+
+    def open(self, command, **popen_kwargs):
+        """Start a local command and return the Popen for streaming I/O"""
+        time.sleep(self.latency)
+        self.stats.round_trips += 1
+        return subprocess.Popen(self.local_command(command), cwd=self.root, env=self.env, **popen_kwargs)
+
+    def close(self):
+        """Report stats once; there is no connection to tear down"""
+        if not self.closed:
+            self.closed = True
+            self.print_stats()